@@ -32,6 +32,12 @@ case "$1" in
         exec uvicorn src.api.main:app --host 0.0.0.0 --port 8000 --reload
         ;;
     
+    web)
+        echo -e "${YELLOW}Starting watchlist web server (gunicorn)...${NC}"
+        exec gunicorn -w "${WEB_WORKERS:-4}" -k gthread --threads 8 --preload \
+            --pythonpath scripts -b 0.0.0.0:5001 wsgi:app
+        ;;
+    
     worker)
         echo -e "${YELLOW}Starting background worker...${NC}"
         exec python -m src.worker.main
@@ -0,0 +1,16 @@
+"""
+脚本运行环境初始化
+Script Environment Setup
+
+清除代理环境变量，避免数据源连接问题。
+须在导入 akshare / requests 之前导入，使其创建的会话继承清理后的环境。
+"""
+
+import os
+
+os.environ['no_proxy'] = '*'
+os.environ['NO_PROXY'] = '*'
+os.environ.pop('HTTP_PROXY', None)
+os.environ.pop('HTTPS_PROXY', None)
+os.environ.pop('http_proxy', None)
+os.environ.pop('https_proxy', None)
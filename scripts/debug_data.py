@@ -1,3 +1,4 @@
+import _env  # noqa: F401  清除代理，须最先导入
 import sys
 import os
 import pandas as pd
@@ -7,14 +8,6 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.data_acquisition.stock_data import StockDataFetcher
 
-# Unset proxy
-os.environ['no_proxy'] = '*'
-os.environ['NO_PROXY'] = '*'
-os.environ.pop('HTTP_PROXY', None)
-os.environ.pop('HTTPS_PROXY', None)
-os.environ.pop('http_proxy', None)
-os.environ.pop('https_proxy', None)
-
 fetcher = StockDataFetcher()
 print("Fetching stock list...")
 try:
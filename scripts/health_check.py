@@ -7,60 +7,85 @@ System Health Check
 
 import sys
 import os
+import argparse
+import importlib
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def check_module(module_name, import_statement):
-    """检查模块是否可以导入"""
+# 检查项：(分组标题, [(结果键, 显示名称, 模块路径), ...])
+CHECKS = [
+    ("基础库检查", [
+        ('pandas', "pandas", "pandas"),
+        ('numpy', "numpy", "numpy"),
+        ('yaml', "yaml", "yaml"),
+    ]),
+    ("数据获取库", [
+        ('akshare', "akshare", "akshare"),
+        ('tushare', "tushare", "tushare"),
+    ]),
+    ("机器学习库", [
+        ('sklearn', "scikit-learn", "sklearn"),
+        ('xgboost', "xgboost", "xgboost"),
+    ]),
+    ("深度学习库（可选）", [
+        ('tensorflow', "tensorflow", "tensorflow"),
+    ]),
+    ("自定义模块", [
+        ('data_acquisition', "数据获取模块", "src.data_acquisition.stock_data"),
+        ('features', "特征工程模块", "src.features.technical"),
+        ('preprocessing', "数据预处理模块", "src.preprocessing.processor"),
+    ]),
+]
+
+def probe_module(module_path, deep=False):
+    """
+    探测模块是否可用
+    
+    默认只通过 find_spec 定位模块而不执行模块代码；deep 模式下实际导入
+    
+    Returns:
+        (是否可用, 错误信息)
+    """
     try:
-        exec(import_statement)
-        print(f"✓ {module_name} 导入成功")
-        return True
+        if deep:
+            importlib.import_module(module_path)
+        elif importlib.util.find_spec(module_path) is None:
+            raise ModuleNotFoundError(f"No module named '{module_path}'")
+        return True, None
     except Exception as e:
-        print(f"✗ {module_name} 导入失败: {str(e)}")
-        return False
+        return False, str(e)
 
 def main():
+    parser = argparse.ArgumentParser(description='系统健康检查')
+    parser.add_argument('--deep', action='store_true', help='实际导入各模块（较慢）')
+    args = parser.parse_args()
+    deep = args.deep
+    
     print("=" * 60)
     print("  股票预测系统 - 健康检查")
     print("=" * 60)
     
-    results = {}
-    
-    # 基础库检查
-    print("\n【基础库检查】")
-    results['pandas'] = check_module("pandas", "import pandas")
-    results['numpy'] = check_module("numpy", "import numpy")
-    results['yaml'] = check_module("yaml", "import yaml")
-    
-    # 数据获取库
-    print("\n【数据获取库】")
-    results['akshare'] = check_module("akshare", "import akshare")
-    results['tushare'] = check_module("tushare", "import tushare")
-    
-    # 机器学习库
-    print("\n【机器学习库】")
-    results['sklearn'] = check_module("scikit-learn", "import sklearn")
-    results['xgboost'] = check_module("xgboost", "import xgboost")
+    # 各模块探测相互独立，并发执行
+    items = [item for _, group in CHECKS for item in group]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        probes = dict(zip(
+            [key for key, _, _ in items],
+            executor.map(lambda item: probe_module(item[2], deep), items)
+        ))
     
-    # 深度学习库（可选）
-    print("\n【深度学习库（可选）】")
-    results['tensorflow'] = check_module("tensorflow", "import tensorflow")
-    
-    # 自定义模块
-    print("\n【自定义模块】")
-    results['data_acquisition'] = check_module(
-        "数据获取模块", 
-        "from src.data_acquisition.stock_data import StockDataFetcher"
-    )
-    results['features'] = check_module(
-        "特征工程模块",
-        "from src.features.technical import TechnicalIndicators"
-    )
-    results['preprocessing'] = check_module(
-        "数据预处理模块",
-        "from src.preprocessing.processor import DataProcessor"
-    )
+    # 按分组顺序输出结果
+    results = {}
+    for title, group in CHECKS:
+        print(f"\n【{title}】")
+        for key, name, _ in group:
+            ok, error = probes[key]
+            if ok:
+                print(f"✓ {name} {'导入成功' if deep else '可用'}")
+            else:
+                print(f"✗ {name} {'导入失败' if deep else '不可用'}: {error}")
+            results[key] = ok
     
     # 统计结果
     print("\n" + "=" * 60)
@@ -12,53 +12,85 @@ Stock Outbreak Prediction Script
 - 生成综合分析报告
 """
 
+import _env  # noqa: F401  清除代理，须最先导入
+import io
 import sys
 import os
+import re
+import atexit
 import argparse
 from datetime import datetime
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.data_acquisition.stock_data import StockDataFetcher
-from src.data_acquisition.fund_flow import FundFlowFetcher
-from src.data_acquisition.institution import InstitutionalDataFetcher
-from src.features.technical import TechnicalIndicators
-from src.features.institutional import InstitutionalFeatures
-from src.features.sentiment import MarketSentiment
+# 数据获取和特征模块在首次分析时才导入，保证 --help 和参数校验快速返回
+
+# 6位股票代码
+_CODE_RE = re.compile(r'\d{6}')
+
+# 交互模式输入历史文件
+_HISTORY_FILE = os.path.expanduser('~/.mystock_history')
+
+# 已分析过的股票代码（交互模式Tab补全）
+_seen_codes = set()
+
+# 数据获取器/特征计算器的共享实例（多只股票及交互模式多次分析间复用）
+_instances = {}
+
+# 综合评分结论（按分数从高到低）
+_VERDICTS = ["🚀 极高爆发潜力", "📈 具备上涨潜力", "👀 建议观望"]
+
 
-def analyze_stock(stock_code: str):
+def _shared(cls):
+    """返回cls的共享实例，首次调用时创建"""
+    if cls not in _instances:
+        _instances[cls] = cls()
+    return _instances[cls]
+
+
+def _collect_latest(stock_code: str, df: pd.DataFrame, buf: io.StringIO) -> Optional[dict]:
     """
-    分析单只股票
+    将单只股票的分项分析写入buf，返回用于评分的最新指标
     """
-    print(f"\n🔍 正在分析股票: {stock_code} ...")
-    print("=" * 50)
+    from src.cache import load_or_compute
+    from src.features.technical import TechnicalIndicators
+    from src.features.institutional import InstitutionalFeatures
+    from src.features.sentiment import MarketSentiment
+    from src.utils import latest_value
     
-    # 1. 获取数据
-    print("1. 获取行情数据...")
-    data_fetcher = StockDataFetcher()
-    df = data_fetcher.get_daily_data(stock_code)
+    print(f"\n🔍 正在分析股票: {stock_code} ...", file=buf)
+    print("=" * 50, file=buf)
     
+    # 1. 行情数据
+    print("1. 获取行情数据...", file=buf)
     if df.empty:
-        print(f"❌ 无法获取股票 {stock_code} 的数据，请检查代码是否正确。")
-        return
+        print(f"❌ 无法获取股票 {stock_code} 的数据，请检查代码是否正确。", file=buf)
+        return None
     
-    latest = df.iloc[0]
-    print(f"   最新日期: {latest['trade_date']}")
-    print(f"   最新收盘: {latest['close']:.2f}")
-    print(f"   今日涨跌: {latest['pct_chg']:.2f}%")
+    idx0 = df.index[0]
+    latest_date = df.at[idx0, 'trade_date']
+    print(f"   最新日期: {latest_date}", file=buf)
+    print(f"   最新收盘: {df.at[idx0, 'close']:.2f}", file=buf)
+    print(f"   今日涨跌: {df.at[idx0, 'pct_chg']:.2f}%", file=buf)
     
     # 2. 技术面分析
-    print("\n2. 技术面分析...")
-    tech_calc = TechnicalIndicators()
-    df_tech = tech_calc.calculate_all_indicators(df)
-    latest_tech = df_tech.iloc[0]
+    print("\n2. 技术面分析...", file=buf)
+    tech_calc = _shared(TechnicalIndicators)
+    df_tech = load_or_compute(
+        f"tech_{stock_code}_{latest_date}",
+        lambda: tech_calc.calculate_all_indicators(df)
+    )
     
     # 简单的趋势判断
-    ma5 = latest_tech.get('ma_5', 0)
-    ma20 = latest_tech.get('ma_20', 0)
-    macd = latest_tech.get('macd', 0)
-    rsi = latest_tech.get('rsi', 50)
+    ma5 = latest_value(df_tech, 'ma_5')
+    ma20 = latest_value(df_tech, 'ma_20')
+    macd = latest_value(df_tech, 'macd')
+    rsi = latest_value(df_tech, 'rsi', 50)
     
     trend = "震荡"
     if ma5 > ma20 and macd > 0:
@@ -66,97 +98,173 @@ def analyze_stock(stock_code: str):
     elif ma5 < ma20 and macd < 0:
         trend = "下跌 📉"
         
-    print(f"   趋势判断: {trend}")
-    print(f"   MACD信号: {'金叉/强势' if macd > 0 else '死叉/弱势'} ({macd:.4f})")
-    print(f"   RSI指标: {rsi:.2f} ({'超买' if rsi>80 else '超卖' if rsi<20 else '正常'})")
+    print(f"   趋势判断: {trend}", file=buf)
+    print(f"   MACD信号: {'金叉/强势' if macd > 0 else '死叉/弱势'} ({macd:.4f})", file=buf)
+    print(f"   RSI指标: {rsi:.2f} ({'超买' if rsi>80 else '超卖' if rsi<20 else '正常'})", file=buf)
     
     # 3. 资金面分析
-    print("\n3. 资金面分析...")
-    inst_fetcher = InstitutionalFeatures()
+    print("\n3. 资金面分析...", file=buf)
+    inst_fetcher = _shared(InstitutionalFeatures)
+    net_inflow = np.nan
     # 注意：这里可能会因为网络问题失败，做个简单的容错
     try:
         inst_features = inst_fetcher.extract_all_features(stock_code)
         net_inflow = inst_features.get('main_net_inflow_total', 0)
-        print(f"   主力净流入(近5日): {net_inflow/10000:.2f} 万元")
-        print(f"   连续流入天数: {inst_features.get('consecutive_inflow_days', 0)} 天")
+        print(f"   主力净流入(近5日): {net_inflow/10000:.2f} 万元", file=buf)
+        print(f"   连续流入天数: {inst_features.get('consecutive_inflow_days', 0)} 天", file=buf)
     except Exception as e:
-        print(f"   ⚠️ 资金数据获取受限: {str(e)}")
+        print(f"   ⚠️ 资金数据获取受限: {str(e)}", file=buf)
         
     # 4. 情绪面分析
-    print("\n4. 情绪面分析...")
-    sent_calc = MarketSentiment()
-    df_sent = sent_calc.calculate_all_sentiment_features(df)
-    latest_sent = df_sent.iloc[0]
-    
-    vol_ratio = latest_sent.get('volume_ratio', 0)
-    amplitude = latest_sent.get('amplitude', 0)
-    
-    print(f"   量比: {vol_ratio:.2f} ({'放量' if vol_ratio > 1.5 else '缩量' if vol_ratio < 0.8 else '正常'})")
-    print(f"   振幅: {amplitude:.2f}%")
-
-    # 5. 综合评分
-    print("\n" + "=" * 50)
-    print("📊 综合预测结果")
-    print("=" * 50)
-    
-    score = 0
-    reasons = []
-    
-    # 技术面打分
-    if ma5 > ma20: score += 2
-    if macd > 0: score += 2
-    if 30 < rsi < 70: score += 1
-    
-    # 情绪面打分
-    if vol_ratio > 1.2: 
-        score += 2
-        reasons.append("成交量放大")
-    
-    # 资金面打分
-    if 'net_inflow' in locals() and net_inflow > 0:
-        score += 2
-        reasons.append("主力资金净流入")
-        
-    print(f"综合评分: {score}/10")
+    print("\n4. 情绪面分析...", file=buf)
+    sent_calc = _shared(MarketSentiment)
+    df_sent = sent_calc.calculate_all_sentiment_features(df_tech)
     
-    if score >= 7:
-        print("预测结论: 🚀 极高爆发潜力")
-    elif score >= 5:
-        print("预测结论: 📈 具备上涨潜力")
-    else:
-        print("预测结论: 👀 建议观望")
+    vol_ratio = latest_value(df_sent, 'volume_ratio')
+    amplitude = latest_value(df_sent, 'amplitude')
+    
+    print(f"   量比: {vol_ratio:.2f} ({'放量' if vol_ratio > 1.5 else '缩量' if vol_ratio < 0.8 else '正常'})", file=buf)
+    print(f"   振幅: {amplitude:.2f}%", file=buf)
+    
+    return {
+        'ma_5': ma5,
+        'ma_20': ma20,
+        'macd': macd,
+        'rsi': rsi,
+        'volume_ratio': vol_ratio,
+        'amplitude': amplitude,
+        'net_inflow': net_inflow
+    }
+
+
+def score_stocks(latest_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    对一批股票的最新指标进行向量化综合评分
+    
+    Args:
+        latest_df: 每行一只股票，包含 ma_5, ma_20, macd, rsi, volume_ratio, net_inflow 列
+    
+    Returns:
+        包含 score, verdict, vol_up, inflow 列的DataFrame
+    """
+    v = latest_df.fillna(0)
+    
+    # 情绪面 / 资金面信号
+    vol_up = (v['volume_ratio'] > 1.2).to_numpy()
+    inflow = (v['net_inflow'] > 0).to_numpy()
+    
+    score = (
+        2 * (v['ma_5'] > v['ma_20']).to_numpy().astype(np.int8)
+        + 2 * (v['macd'] > 0).to_numpy()
+        + ((v['rsi'] > 30) & (v['rsi'] < 70)).to_numpy()
+        + 2 * vol_up
+        + 2 * inflow
+    )
+    verdict = np.select([score >= 7, score >= 5], _VERDICTS[:2], default=_VERDICTS[2])
+    
+    return pd.DataFrame(
+        {'score': score, 'verdict': verdict, 'vol_up': vol_up, 'inflow': inflow},
+        index=latest_df.index
+    )
+
+
+def analyze_stock(stock_codes: Union[str, List[str]]):
+    """
+    分析一只或多只股票
+    """
+    from src.data_acquisition.stock_data import StockDataFetcher
+    
+    if isinstance(stock_codes, str):
+        stock_codes = [stock_codes]
+    
+    # 并发获取行情数据（get_daily_data自带磁盘缓存，区间含当天时短时间后即刷新）
+    data_fetcher = _shared(StockDataFetcher)
+    daily_data = data_fetcher.get_daily_data_batch(stock_codes)
+    
+    # 每只股票的报告先写入缓冲区，再一次性输出
+    rows = {}
+    for code in stock_codes:
+        with io.StringIO() as buf:
+            row = _collect_latest(code, daily_data[code], buf)
+            sys.stdout.write(buf.getvalue())
+        if row is not None:
+            rows[code] = row
+    
+    if not rows:
+        return
+    
+    # 5. 综合评分（一次性对所有股票打分）
+    latest_df = pd.DataFrame.from_dict(rows, orient='index')
+    scored = score_stocks(latest_df)
+    
+    with io.StringIO() as buf:
+        for code, result in scored.iterrows():
+            print("\n" + "=" * 50, file=buf)
+            print(f"📊 综合预测结果 ({code})", file=buf)
+            print("=" * 50, file=buf)
+            print(f"综合评分: {result['score']}/10", file=buf)
+            print(f"预测结论: {result['verdict']}", file=buf)
+            
+            reasons = []
+            if result['vol_up']:
+                reasons.append("成交量放大")
+            if result['inflow']:
+                reasons.append("主力资金净流入")
+            if reasons:
+                print(f"关键驱动: {', '.join(reasons)}", file=buf)
         
-    if reasons:
-        print(f"关键驱动: {', '.join(reasons)}")
+        print("\n⚠️ 免责声明: 结果仅供参考，不构成投资建议。", file=buf)
+        sys.stdout.write(buf.getvalue())
+
+def _validate_code(value: str) -> str:
+    """
+    argparse 参数校验：提取6位股票代码（如 "600519.SH" -> "600519"）
+    """
+    match = _CODE_RE.search(value)
+    if not match:
+        raise argparse.ArgumentTypeError(f"未识别到有效的股票代码: {value}，请输入6位数字代码")
+    return match.group(0)
+
+def _setup_readline():
+    """
+    交互模式启用输入历史（↑ 重复上次代码）和已分析代码的Tab补全
+    
+    readline 不可用的平台（如Windows）直接跳过
+    """
+    try:
+        import readline
+    except ImportError:
+        return
     
-    print("\n⚠️ 免责声明: 结果仅供参考，不构成投资建议。")
+    try:
+        readline.read_history_file(_HISTORY_FILE)
+    except OSError:
+        pass
+    readline.set_history_length(1000)
+    atexit.register(readline.write_history_file, _HISTORY_FILE)
+    
+    # 历史记录中的代码也加入补全候选
+    for i in range(1, readline.get_current_history_length() + 1):
+        _seen_codes.update(_CODE_RE.findall(readline.get_history_item(i) or ''))
+    
+    def completer(text, state):
+        matches = sorted(code for code in _seen_codes if code.startswith(text))
+        return matches[state] if state < len(matches) else None
+    
+    readline.set_completer(completer)
+    readline.parse_and_bind('tab: complete')
 
 def main():
     parser = argparse.ArgumentParser(description='股票爆发预测工具')
-    parser.add_argument('code', nargs='*', help='股票代码 (例如: 600519)')
+    parser.add_argument('code', nargs='*', type=_validate_code, help='股票代码 (例如: 600519)')
     args = parser.parse_args()
     
-    # 处理传入的参数列表
+    # 参数在解析阶段已校验并提取为6位代码
     if args.code:
-        # 过滤掉非数字的参数（比如注释或多余文字）
-        valid_codes = [c for c in args.code if c.strip().isdigit() and len(c.strip()) == 6]
-        
-        if not valid_codes:
-            # 尝试处理包含非数字字符的单个参数 (如 "600519.SH")
-            raw_input = " ".join(args.code)
-            import re
-            # 提取6位数字
-            match = re.search(r'\d{6}', raw_input)
-            if match:
-                valid_codes = [match.group(0)]
-        
-        if valid_codes:
-            for code in valid_codes:
-                analyze_stock(code)
-        else:
-            print(f"❌ 未识别到有效的股票代码。请输入6位数字代码。")
+        analyze_stock(args.code)
     else:
         # 交互模式
+        _setup_readline()
         while True:
             try:
                 code = input("\n请输入股票代码 (输入 q 退出): ").strip()
@@ -166,9 +274,9 @@ def main():
                     continue
                 
                 # 提取代码
-                import re
-                match = re.search(r'\d{6}', code)
+                match = _CODE_RE.search(code)
                 if match:
+                    _seen_codes.add(match.group(0))
                     analyze_stock(match.group(0))
                 else:
                     print("❌ 请输入有效的6位股票代码")
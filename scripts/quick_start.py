@@ -5,6 +5,7 @@ Quick Start Script
 快速演示系统核心功能
 """
 
+import _env  # noqa: F401  清除代理，须最先导入
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -12,6 +13,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from src.data_acquisition.stock_data import StockDataFetcher
 from src.data_acquisition.fund_flow import FundFlowFetcher
 from src.features.technical import TechnicalIndicators
+from src.utils import latest_value
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -29,12 +31,11 @@ def main():
     if not df.empty:
         print(f"✓ 成功获取 {len(df)} 条数据")
         print(f"\n最新行情:")
-        latest = df.iloc[0]
-        print(f"  日期: {latest.get('trade_date', 'N/A')}")
-        print(f"  收盘价: {latest.get('close', 0):.2f} 元")
-        print(f"  涨跌幅: {latest.get('pct_chg', 0):.2f}%")
-        print(f"  成交量: {latest.get('vol', 0):.0f} 手")
-        print(f"  成交额: {latest.get('amount', 0)/100000000:.2f} 亿元")
+        print(f"  日期: {latest_value(df, 'trade_date', 'N/A')}")
+        print(f"  收盘价: {latest_value(df, 'close', 0):.2f} 元")
+        print(f"  涨跌幅: {latest_value(df, 'pct_chg', 0):.2f}%")
+        print(f"  成交量: {latest_value(df, 'vol', 0):.0f} 手")
+        print(f"  成交额: {latest_value(df, 'amount', 0)/100000000:.2f} 亿元")
     else:
         print("✗ 未获取到数据，请检查网络连接或数据源")
         return
@@ -44,12 +45,11 @@ def main():
     calculator = TechnicalIndicators()
     df_tech = calculator.calculate_all_indicators(df)
     
-    latest = df_tech.iloc[0]
     print(f"✓ 技术指标计算完成")
-    print(f"  MA5: {latest.get('ma_5', 0):.2f}")
-    print(f"  MA20: {latest.get('ma_20', 0):.2f}")
-    print(f"  RSI: {latest.get('rsi', 0):.2f}")
-    print(f"  MACD: {latest.get('macd', 0):.4f}")
+    print(f"  MA5: {latest_value(df_tech, 'ma_5', 0):.2f}")
+    print(f"  MA20: {latest_value(df_tech, 'ma_20', 0):.2f}")
+    print(f"  RSI: {latest_value(df_tech, 'rsi', 0):.2f}")
+    print(f"  MACD: {latest_value(df_tech, 'macd', 0):.4f}")
     
     # 3. 获取主力资金排名
     print("\n💰 正在获取主力资金流向...")
@@ -59,8 +59,11 @@ def main():
         
         if not rank.empty:
             print(f"✓ 今日主力资金流向TOP5:")
-            for idx, row in rank.head(5).iterrows():
-                print(f"  {row.get('名称', 'N/A')}: {row.get('主力净流入', 0):.2f}万")
+            top = rank.head(5).reindex(columns=['名称', '主力净流入']).fillna({'名称': 'N/A', '主力净流入': 0})
+            print("\n".join(
+                f"  {name}: {inflow:.2f}万"
+                for name, inflow in top.itertuples(index=False, name=None)
+            ))
     except Exception as e:
         print(f"⚠️  资金流向数据获取失败: {str(e)}")
     
@@ -1,13 +1,7 @@
-import os
+import _env  # noqa: F401  清除代理，须最先导入
 import requests
 import akshare as ak
 
-# Clear proxy envs
-os.environ.pop('HTTP_PROXY', None)
-os.environ.pop('HTTPS_PROXY', None)
-os.environ.pop('http_proxy', None)
-os.environ.pop('https_proxy', None)
-
 print("Testing connection to eastmoney...")
 try:
     # URL similar to what akshare uses
@@ -1,13 +1,5 @@
+import _env  # noqa: F401  清除代理，须最先导入
 import akshare as ak
-import os
-
-# Unset proxy
-os.environ['no_proxy'] = '*'
-os.environ['NO_PROXY'] = '*'
-os.environ.pop('HTTP_PROXY', None)
-os.environ.pop('HTTPS_PROXY', None)
-os.environ.pop('http_proxy', None)
-os.environ.pop('https_proxy', None)
 
 print("Testing Sina Daily History...")
 try:
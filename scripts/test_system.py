@@ -10,12 +10,15 @@ Test Script for Stock Prediction System
 5. 综合分析报告
 """
 
+import _env  # noqa: F401  清除代理，须最先导入
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from types import SimpleNamespace
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -25,6 +28,20 @@ from src.data_acquisition.fund_flow import FundFlowFetcher
 from src.features.technical import TechnicalIndicators
 from src.features.institutional import InstitutionalFeatures
 from src.features.sentiment import MarketSentiment
+from src.utils import latest_value
+
+
+# 综合评分规则: (信号描述, 分值, 判定条件)，信号描述为None时只计分不列为关键信号
+_RULES = [
+    ("均线多头排列", 2, lambda v: v.close > v.ma5 > v.ma20),
+    (None, 1, lambda v: 30 < v.rsi < 70),
+    ("RSI超卖", 2, lambda v: v.rsi < 30),
+    ("MACD金叉", 2, lambda v: v.macd > v.macd_signal and v.macd > 0),
+    ("主力资金流入", 2, lambda v: v.main_inflow > 5000000),
+    ("连续{consecutive_days}日资金流入", 1, lambda v: v.consecutive_days >= 3),
+    ("登上龙虎榜", 1, lambda v: v.lhb_count > 0),
+]
+_RULE_WEIGHTS = np.array([weight for _, weight, _ in _RULES])
 
 
 def print_section(title):
@@ -43,11 +60,14 @@ def test_data_acquisition():
     # 测试股票代码
     test_stocks = ['600519', '000001', '600036']
     
-    for stock in test_stocks:
+    # 缓冲批量获取日线数据，退出上下文时统一并发请求
+    with fetcher.buffered_fetch() as bf:
+        futures = [bf.get_daily_data(stock) for stock in test_stocks]
+    
+    for stock, future in zip(test_stocks, futures):
         print(f"\n📊 获取 {stock} 的数据...")
         try:
-            # 获取日线数据
-            df = fetcher.get_daily_data(stock)
+            df = future.result()
             if not df.empty:
                 print(f"✓ 成功获取 {len(df)} 条日线数据")
                 print(f"  日期范围: {df['trade_date'].min()} - {df['trade_date'].max()}")
@@ -147,7 +167,11 @@ def test_fund_flow_analysis():
         if not rank.empty:
             print(f"✓ 成功获取主力资金排名")
             print(f"\n今日主力资金流向TOP10:")
-            print(rank[['代码', '名称', '主力净流入', '主力净占比']].head(10).to_string(index=False))
+            rows = rank[['代码', '名称', '主力净流入', '主力净占比']].head(10).itertuples(index=False, name=None)
+            print("\n".join(
+                f"{code} {name:>8s} {inflow:>14.0f} {ratio:>6.2f}"
+                for code, name, inflow, ratio in rows
+            ))
         else:
             print(f"✗ 未获取到数据")
             
@@ -197,18 +221,18 @@ def generate_analysis_report(stock_code, technical_df, inst_features):
     """生成综合分析报告"""
     print_section("6. 综合分析报告")
     
-    print(f"\n📋 {stock_code} 综合分析报告")
-    print(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    # 报告内容先收集到列表，最后一次性输出
+    lines = []
+    lines.append(f"\n📋 {stock_code} 综合分析报告")
+    lines.append(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
     if technical_df is not None and not technical_df.empty:
-        latest = technical_df.iloc[0]
-        
-        print(f"\n【技术面分析】")
+        lines.append(f"\n【技术面分析】")
         
         # 趋势判断
-        ma5 = latest.get('ma_5', 0)
-        ma20 = latest.get('ma_20', 0)
-        close = latest.get('close', 0)
+        ma5 = latest_value(technical_df, 'ma_5', 0)
+        ma20 = latest_value(technical_df, 'ma_20', 0)
+        close = latest_value(technical_df, 'close', 0)
         
         if close > ma5 > ma20:
             trend = "强势上涨趋势 📈"
@@ -219,31 +243,31 @@ def generate_analysis_report(stock_code, technical_df, inst_features):
         else:
             trend = "震荡整理 ↔️"
         
-        print(f"  趋势: {trend}")
+        lines.append(f"  趋势: {trend}")
         
         # RSI判断
-        rsi = latest.get('rsi', 50)
+        rsi = latest_value(technical_df, 'rsi', 50)
         if rsi > 70:
             rsi_status = "超买 ⚠️"
         elif rsi < 30:
             rsi_status = "超卖 💡"
         else:
             rsi_status = "正常"
-        print(f"  RSI状态: {rsi_status} (RSI={rsi:.2f})")
+        lines.append(f"  RSI状态: {rsi_status} (RSI={rsi:.2f})")
         
         # MACD判断
-        macd = latest.get('macd', 0)
-        macd_signal = latest.get('macd_signal', 0)
+        macd = latest_value(technical_df, 'macd', 0)
+        macd_signal = latest_value(technical_df, 'macd_signal', 0)
         if macd > macd_signal and macd > 0:
             macd_status = "金叉向上 ✓"
         elif macd < macd_signal and macd < 0:
             macd_status = "死叉向下 ✗"
         else:
             macd_status = "中性"
-        print(f"  MACD状态: {macd_status}")
+        lines.append(f"  MACD状态: {macd_status}")
     
     if inst_features:
-        print(f"\n【资金面分析】")
+        lines.append(f"\n【资金面分析】")
         
         # 主力资金判断
         main_inflow = inst_features.get('main_net_inflow_total', 0)
@@ -258,8 +282,8 @@ def generate_analysis_report(stock_code, technical_df, inst_features):
         else:
             fund_status = "资金平衡 ↔️"
         
-        print(f"  资金状态: {fund_status}")
-        print(f"  连续流入: {consecutive_days} 天")
+        lines.append(f"  资金状态: {fund_status}")
+        lines.append(f"  连续流入: {consecutive_days} 天")
         
         # 机构行为判断
         lhb_count = inst_features.get('lhb_appear_count', 0)
@@ -270,40 +294,23 @@ def generate_analysis_report(stock_code, technical_df, inst_features):
         else:
             inst_status = "机构关注度一般"
         
-        print(f"  机构关注: {inst_status}")
-        
-        # 综合评分
-        score = 0
-        signals = []
-        
-        if close > ma5 > ma20:
-            score += 2
-            signals.append("均线多头排列")
-        
-        if 30 < rsi < 70:
-            score += 1
-        elif rsi < 30:
-            score += 2
-            signals.append("RSI超卖")
-        
-        if macd > macd_signal and macd > 0:
-            score += 2
-            signals.append("MACD金叉")
+        lines.append(f"  机构关注: {inst_status}")
         
-        if main_inflow > 5000000:
-            score += 2
-            signals.append("主力资金流入")
+        # 综合评分（规则表驱动）
+        v = SimpleNamespace(
+            close=close, ma5=ma5, ma20=ma20, rsi=rsi, macd=macd, macd_signal=macd_signal,
+            main_inflow=main_inflow, consecutive_days=consecutive_days, lhb_count=lhb_count
+        )
+        hits = np.fromiter((rule(v) for _, _, rule in _RULES), dtype=bool, count=len(_RULES))
+        score = int((hits * _RULE_WEIGHTS).sum())
+        signals = [
+            label.format(**vars(v))
+            for (label, _, _), hit in zip(_RULES, hits)
+            if hit and label
+        ]
         
-        if consecutive_days >= 3:
-            score += 1
-            signals.append(f"连续{consecutive_days}日资金流入")
-        
-        if lhb_count > 0:
-            score += 1
-            signals.append("登上龙虎榜")
-        
-        print(f"\n【综合评分】")
-        print(f"  评分: {score}/10")
+        lines.append(f"\n【综合评分】")
+        lines.append(f"  评分: {score}/10")
         
         if score >= 7:
             rating = "强烈看好 ⭐⭐⭐⭐⭐"
@@ -314,14 +321,16 @@ def generate_analysis_report(stock_code, technical_df, inst_features):
         else:
             rating = "谨慎 ⭐⭐"
         
-        print(f"  评级: {rating}")
+        lines.append(f"  评级: {rating}")
         
         if signals:
-            print(f"\n【关键信号】")
+            lines.append(f"\n【关键信号】")
             for signal in signals:
-                print(f"  • {signal}")
+                lines.append(f"  • {signal}")
+    
+    lines.append(f"\n⚠️  风险提示: 以上分析仅供参考，不构成投资建议！")
     
-    print(f"\n⚠️  风险提示: 以上分析仅供参考，不构成投资建议！")
+    print("\n".join(lines))
 
 
 def main():
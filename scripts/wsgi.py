@@ -0,0 +1,17 @@
+"""
+WSGI入口，供生产环境的gunicorn使用（在项目根目录执行）:
+
+    gunicorn -w 4 -k gthread --threads 8 --preload --pythonpath scripts -b 0.0.0.0:5001 wsgi:app
+
+--preload 使股票列表缓存在fork之前只加载一次，各worker通过写时复制共享。
+"""
+import _env  # noqa: F401  清除代理，须最先导入
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.api.app import app  # noqa: E402
+
+__all__ = ['app']
@@ -1,8 +1,12 @@
 import os
-import json
+import copy
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Flask, jsonify, request, send_from_directory
+import orjson
+from flask import Flask, Response, request, send_from_directory
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
@@ -24,47 +28,119 @@ fetcher = StockDataFetcher()
 tech_calculator = TechnicalIndicators()
 inst_extractor = InstitutionalFeatures()
 
+# Shared pool for overlapping per-stock network fetches
+EXECUTOR = ThreadPoolExecutor(max_workers=16)
+
+# TTL caches: daily bars barely move intraday, the stock list changes daily at most
+DAILY_TTL = 300
+DAILY_CACHE_SIZE = 1024
+STOCK_LIST_TTL = 24 * 3600
+
+_daily_cache = {}  # normalized code -> (fetched_at, df)
+_daily_lock = threading.Lock()
+
+def cached_daily(code):
+    """fetcher.get_daily_data memoized for DAILY_TTL seconds per normalized code"""
+    now = time.monotonic()
+    with _daily_lock:
+        hit = _daily_cache.get(code)
+    if hit is not None and now - hit[0] < DAILY_TTL:
+        return hit[1]
+    
+    df = fetcher.get_daily_data(code)
+    # Don't cache failures so the next request retries
+    if not df.empty:
+        with _daily_lock:
+            _daily_cache.pop(code, None)
+            if len(_daily_cache) >= DAILY_CACHE_SIZE:
+                # Dicts keep insertion order, so the first key is the oldest entry
+                _daily_cache.pop(next(iter(_daily_cache)))
+            _daily_cache[code] = (now, df)
+    return df
+
+# Lookup structures derived from stock_list_cache
+CODE2NAME = {}       # ts_code -> name
+CODE2NAME_BARE = {}  # code without suffix -> name
+TS_LOWER = None      # lowercased ts_code array (numpy unicode) for search
+NAME_LOWER = None    # lowercased name array (numpy unicode) for search
+stock_list_loaded_at = 0.0
+
+def index_stock_list(df):
+    """Build hash lookups and lowercased search arrays from the stock list"""
+    global CODE2NAME, CODE2NAME_BARE, TS_LOWER, NAME_LOWER, stock_list_loaded_at
+    stock_list_loaded_at = time.monotonic()
+    CODE2NAME = dict(zip(df['ts_code'].values, df['name'].values))
+    CODE2NAME_BARE = {c.split('.')[0]: n for c, n in CODE2NAME.items()}
+    # Convert to fixed-width unicode once so searches skip the per-request astype
+    TS_LOWER = df['ts_code'].str.lower().to_numpy(dtype=str)
+    NAME_LOWER = df['name'].str.lower().to_numpy(dtype=str)
+
+def lookup_name(normalized_code, code):
+    """Resolve stock name by full code first, then bare code"""
+    return CODE2NAME.get(normalized_code) or CODE2NAME_BARE.get(code, code)
+
 # Cache stock list at startup
 print("Initializing stock list cache...")
 try:
     stock_list_cache = fetcher.get_stock_list()
+    index_stock_list(stock_list_cache)
     print(f"Stock list cached: {len(stock_list_cache)} stocks")
     print(f"Columns: {stock_list_cache.columns.tolist()}")
     print(f"Sample data:\n{stock_list_cache.head(3)}")
     # Check for specific stocks
     test_codes = ['600519', '600519.SH']
     for test_code in test_codes:
-        match = stock_list_cache[stock_list_cache['ts_code'] == test_code]
-        print(f"Match for '{test_code}': {len(match)} rows")
-        if not match.empty:
-            print(f"  -> {match[['ts_code', 'name']].values}")
+        print(f"Match for '{test_code}': {CODE2NAME.get(test_code)}")
 except Exception as e:
     print(f"Failed to cache stock list: {e}")
     stock_list_cache = None
 
 WATCHLIST_FILE = 'configs/watchlist.json'
 
+# In-memory watchlist, reparsed only when the file's mtime changes
+_WL_CACHE = {'mtime': 0, 'data': None}
+_WL_LOCK = threading.Lock()
+
 def load_watchlist():
-    if os.path.exists(WATCHLIST_FILE):
-        with open(WATCHLIST_FILE, 'r') as f:
-            return json.load(f)
-    return {"stocks": [], "updated_at": ""}
+    with _WL_LOCK:
+        try:
+            st = os.stat(WATCHLIST_FILE)
+        except FileNotFoundError:
+            return {"stocks": [], "updated_at": ""}
+        
+        if st.st_mtime_ns != _WL_CACHE['mtime'] or _WL_CACHE['data'] is None:
+            with open(WATCHLIST_FILE, 'rb') as f:
+                _WL_CACHE['data'] = orjson.loads(f.read())
+            _WL_CACHE['mtime'] = st.st_mtime_ns
+        
+        # Callers mutate the result, so hand out a copy
+        return copy.deepcopy(_WL_CACHE['data'])
 
 def save_watchlist(data):
     data['updated_at'] = datetime.now().isoformat()
-    with open(WATCHLIST_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    with _WL_LOCK:
+        # Write to a temp file and rename so a crash never leaves a truncated watchlist
+        tmp_file = WATCHLIST_FILE + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_file, WATCHLIST_FILE)
+        # Refresh the cache directly instead of re-reading the file
+        _WL_CACHE['data'] = copy.deepcopy(data)
+        _WL_CACHE['mtime'] = os.stat(WATCHLIST_FILE).st_mtime_ns
+
+def ojsonify(obj):
+    """Serialize with orjson; numpy scalars/arrays are encoded natively"""
+    return Response(
+        orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS),
+        mimetype='application/json'
+    )
+
+# Exchange suffix by leading digit
+_SUFFIX = {'6': '.SH', '0': '.SZ', '3': '.SZ', '8': '.BJ', '4': '.BJ'}
 
 def normalize_code(code):
     """Ensure code has suffix for internal use"""
-    if '.' not in code:
-        if code.startswith('6'):
-            return f"{code}.SH"
-        elif code.startswith('0') or code.startswith('3'):
-            return f"{code}.SZ"
-        elif code.startswith('8') or code.startswith('4'):
-            return f"{code}.BJ"
-    return code
+    return code if '.' in code else code + _SUFFIX.get(code[:1], '')
 
 @app.route('/')
 def index():
@@ -73,86 +149,74 @@ def index():
 @app.route('/api/watchlist', methods=['GET'])
 def get_watchlist():
     data = load_watchlist()
+    codes = data.get('stocks', [])
     stocks_data = []
     
-    for code in data.get('stocks', []):
+    # Get latest daily data (or realtime if available)
+    # For now, we use daily data for simplicity and reliability
+    # Fetch all codes concurrently; results are consumed in watchlist order
+    normalized_codes = [normalize_code(code) for code in codes]
+    futures = [EXECUTOR.submit(cached_daily, normalized_code) for normalized_code in normalized_codes]
+    
+    for code, normalized_code, future in zip(codes, normalized_codes, futures):
+        stock_name = lookup_name(normalized_code, code)
+        
+        # Only the fetch itself can fail for reasons outside our control
         try:
-            # Get latest daily data (or realtime if available)
-            # For now, we use daily data for simplicity and reliability
-            normalized_code = normalize_code(code)
-            df = fetcher.get_daily_data(normalized_code)
-            
-            if not df.empty:
-                latest = df.iloc[0]
-                prev = df.iloc[1] if len(df) > 1 else latest
-                
-                # Calculate basic change
-                change = latest['close'] - prev['close']
-                pct_chg = (change / prev['close']) * 100
-                
-                # Try to get name from stock list
-                stock_name = code
-                if stock_list_cache is not None:
-                    # Try matching with full code (e.g., 600519.SH)
-                    name_match = stock_list_cache[stock_list_cache['ts_code'] == normalized_code]['name']
-                    if name_match.empty:
-                        # Try matching without suffix (e.g., 600519)
-                        name_match = stock_list_cache[stock_list_cache['ts_code'] == code]['name']
-                    if not name_match.empty:
-                        stock_name = name_match.values[0]
-                
-                stock_info = {
-                    'code': code,
-                    'name': stock_name,
-                    'price': float(latest['close']),
-                    'change': float(change),
-                    'pct_chg': float(pct_chg),
-                    'volume': float(latest['vol']),
-                    'date': latest['trade_date']
-                }
-                
-                stocks_data.append(stock_info)
-            else:
-                # Try to get name even if data fetch failed
-                stock_name = code
-                normalized_code = normalize_code(code)
-                if stock_list_cache is not None:
-                    # Try matching with full code (e.g., 600519.SH)
-                    name_match = stock_list_cache[stock_list_cache['ts_code'] == normalized_code]['name']
-                    if name_match.empty:
-                        # Try matching without suffix (e.g., 600519)
-                        name_match = stock_list_cache[stock_list_cache['ts_code'] == code]['name']
-                    if not name_match.empty:
-                        stock_name = name_match.values[0]
-                        
-                stocks_data.append({
-                    'code': code,
-                    'name': stock_name,
-                    'error': 'No data'
-                })
+            df = future.result()
         except Exception as e:
             print(f"Error fetching {code}: {e}")
             stocks_data.append({
                 'code': code,
-                'name': code,
+                'name': stock_name,
                 'error': str(e)
             })
+            continue
+        
+        if df is None or df.empty:
+            stocks_data.append({
+                'code': code,
+                'name': stock_name,
+                'error': 'No data'
+            })
+            continue
+        
+        # Only the latest two rows of three columns are needed
+        rows = df[['close', 'vol', 'trade_date']].head(2).to_numpy()
+        close_now, vol_now, date_now = rows[0]
+        close_prev = rows[1, 0] if len(rows) > 1 else close_now
+        
+        # Calculate basic change
+        change = close_now - close_prev
+        pct_chg = (change / close_prev) * 100
+        
+        stocks_data.append({
+            'code': code,
+            'name': stock_name,
+            'price': close_now,
+            'change': change,
+            'pct_chg': pct_chg,
+            'volume': vol_now,
+            'date': date_now
+        })
             
-    return jsonify(stocks_data)
+    return ojsonify(stocks_data)
 
 @app.route('/api/watchlist', methods=['POST'])
 def add_to_watchlist():
     data = request.json
     code = data.get('code')
     if not code:
-        return jsonify({'error': 'Code required'}), 400
+        return ojsonify({'error': 'Code required'}), 400
     
     watchlist = load_watchlist()
     if code not in watchlist['stocks']:
         watchlist['stocks'].append(code)
         save_watchlist(watchlist)
+        # Pre-warm the daily cache so the next watchlist refresh is a hit
+        EXECUTOR.submit(cached_daily, normalize_code(code))
     
-    return jsonify({'success': True, 'stocks': watchlist['stocks']})
+    return ojsonify({'success': True, 'stocks': watchlist['stocks']})
 
 @app.route('/api/watchlist/<code_to_remove>', methods=['DELETE'])
 def remove_from_watchlist(code_to_remove):
@@ -161,7 +225,7 @@ def remove_from_watchlist(code_to_remove):
         watchlist['stocks'].remove(code_to_remove)
         save_watchlist(watchlist)
     
-    return jsonify({'success': True, 'stocks': watchlist['stocks']})
+    return ojsonify({'success': True, 'stocks': watchlist['stocks']})
 
 @app.route('/api/stock/<code>')
 def get_stock_detail(code):
@@ -169,9 +233,9 @@ def get_stock_detail(code):
         normalized_code = normalize_code(code)
         
         # Get daily data
-        df = fetcher.get_daily_data(normalized_code)
+        df = cached_daily(normalized_code)
         if df.empty:
-            return jsonify({'error': 'No data found'}), 404
+            return ojsonify({'error': 'No data found'}), 404
             
         # Calculate indicators
         df_indicators = tech_calculator.calculate_all_indicators(df)
@@ -182,71 +246,68 @@ def get_stock_detail(code):
         # Prepare response
         latest = df_indicators.iloc[0]
         
-        # Convert numpy types to python types for JSON serialization
-        def convert_val(val):
-            if isinstance(val, (np.int64, np.int32)):
-                return int(val)
-            if isinstance(val, (np.float64, np.float32)):
-                return float(val)
-            return val
-
         if 'trade_date' not in latest:
-             return jsonify({'error': 'Invalid data format: missing trade_date'}), 500
+             return ojsonify({'error': 'Invalid data format: missing trade_date'}), 500
              
         response = {
             'info': {
                 'code': code,
                 'date': latest['trade_date'],
-                'price': convert_val(latest.get('close', 0)),
-                'open': convert_val(latest.get('open', 0)),
-                'high': convert_val(latest.get('high', 0)),
-                'low': convert_val(latest.get('low', 0)),
-                'volume': convert_val(latest.get('vol', 0)),
+                'price': latest.get('close', 0),
+                'open': latest.get('open', 0),
+                'high': latest.get('high', 0),
+                'low': latest.get('low', 0),
+                'volume': latest.get('vol', 0),
             },
             'technical': {
-                'ma5': convert_val(latest.get('ma_5')),
-                'ma20': convert_val(latest.get('ma_20')),
-                'rsi': convert_val(latest.get('rsi')),
-                'macd': convert_val(latest.get('macd')),
+                'ma5': latest.get('ma_5'),
+                'ma20': latest.get('ma_20'),
+                'rsi': latest.get('rsi'),
+                'macd': latest.get('macd'),
             },
-            'institutional': {k: convert_val(v) for k, v in inst_features.items()},
+            'institutional': inst_features,
             'history': [] # Can add history for charts later
         }
         
         # Add last 30 days history for sparkline
-        history = df_indicators.head(30)[['trade_date', 'close', 'vol']].to_dict('records')
-        response['history'] = [{k: convert_val(v) for k, v in r.items()} for r in history]
+        # Build rows from three column lists rather than to_dict('records')
+        hist = df_indicators.head(30)
+        response['history'] = [
+            {'trade_date': d, 'close': c, 'vol': v}
+            for d, c, v in zip(hist['trade_date'].tolist(), hist['close'].tolist(), hist['vol'].tolist())
+        ]
         
-        return jsonify(response)
+        return ojsonify(response)
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-# Cache stock list
-stock_list_cache = None
+        return ojsonify({'error': str(e)}), 500
 
 @app.route('/api/search')
 def search_stocks():
     global stock_list_cache
     query = request.args.get('q', '').lower()
     if not query:
-        return jsonify([])
+        return ojsonify([])
         
     try:
-        if stock_list_cache is None:
+        if stock_list_cache is None or time.monotonic() - stock_list_loaded_at > STOCK_LIST_TTL:
             print("Loading stock list cache...")
             stock_list_cache = fetcher.get_stock_list()
+            index_stock_list(stock_list_cache)
             print("Stock list cache loaded.")
             
         df = stock_list_cache
-        # Filter by code or name
-        mask = df['ts_code'].str.lower().str.contains(query) | df['name'].str.lower().str.contains(query)
-        results = df[mask].head(10)
+        # Filter by code or name (single vectorized substring pass each)
+        mask = (np.char.find(TS_LOWER, query) >= 0) | (np.char.find(NAME_LOWER, query) >= 0)
+        # Take the first 10 hits straight from the column arrays, no DataFrame slice
+        idx = np.flatnonzero(mask)[:10]
+        codes = df['ts_code'].to_numpy()[idx].tolist()
+        names = df['name'].to_numpy()[idx].tolist()
         
-        return jsonify(results[['ts_code', 'name']].to_dict('records'))
+        return ojsonify([{'ts_code': c, 'name': n} for c, n in zip(codes, names)])
     except Exception as e:
         print(f"Search error: {e}")
-        return jsonify({'error': str(e)}), 500
+        return ojsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
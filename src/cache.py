@@ -0,0 +1,165 @@
+"""
+本地数据缓存模块
+Local Data Cache
+
+以parquet文件缓存DataFrame结果，跨脚本运行复用：
+- 技术指标（按最新交易日作为键）
+- 数据获取接口的返回结果（disk_cache装饰器，按参数哈希为键，超过TTL失效）
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import re
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+import pandas as pd
+
+# 缓存目录
+CACHE_DIR = os.path.expanduser('~/.mystock_cache')
+
+
+def _cache_path(key: str) -> str:
+    """将缓存键转换为文件路径"""
+    safe_key = re.sub(r'[^0-9A-Za-z_.-]', '_', key)
+    return os.path.join(CACHE_DIR, f"{safe_key}.parquet")
+
+
+def load_cached(key: str) -> Optional[pd.DataFrame]:
+    """
+    读取缓存
+
+    Args:
+        key: 缓存键
+
+    Returns:
+        缓存的DataFrame，未命中或读取失败时返回None
+    """
+    path = _cache_path(key)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        return pd.read_parquet(path)
+    except Exception as e:
+        print(f"读取缓存失败 {key}: {str(e)}")
+        return None
+
+
+def save_cached(key: str, df: pd.DataFrame):
+    """
+    写入缓存（空DataFrame不缓存）
+
+    Args:
+        key: 缓存键
+        df: 待缓存的DataFrame
+    """
+    if df.empty:
+        return
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _write_parquet(df, _cache_path(key))
+    except Exception as e:
+        print(f"写入缓存失败 {key}: {str(e)}")
+
+
+def _write_parquet(df: pd.DataFrame, path: str):
+    """先写临时文件再改名，避免并发读取到写了一半的文件"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_or_compute(key: str, fn: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """
+    命中缓存则直接返回，否则计算并写入缓存
+
+    Args:
+        key: 缓存键，应包含数据日期以便日期变化时自动失效
+        fn: 缓存未命中时调用的计算函数
+
+    Returns:
+        DataFrame结果
+    """
+    df = load_cached(key)
+    if df is not None:
+        return df
+
+    df = fn()
+    save_cached(key, df)
+    return df
+
+
+def disk_cache(
+    ttl_seconds: int,
+    namespace: str,
+    live_ttl_seconds: Optional[int] = None,
+    date_arg: str = 'end_date'
+):
+    """
+    数据获取方法的磁盘缓存装饰器
+
+    以（方法名, 数据源, 全部参数）的MD5为键缓存返回的DataFrame，文件修改时间超过TTL即失效。
+    若请求区间包含当天（date_arg参数为空或不早于今天），数据仍可能变化，
+    改用 live_ttl_seconds；其为None时直接请求不缓存。
+
+    Args:
+        ttl_seconds: 历史数据的缓存有效期（秒）
+        namespace: 缓存子目录
+        live_ttl_seconds: 包含当天数据时的缓存有效期（秒）
+        date_arg: 用于判断是否包含当天的日期参数名 (YYYYMMDD)
+
+    Returns:
+        装饰器
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            params = dict(bound.arguments)
+            params.pop('self', None)
+
+            ttl = ttl_seconds
+            if date_arg in params:
+                date_value = params[date_arg]
+                if not date_value or str(date_value) >= datetime.now().strftime('%Y%m%d'):
+                    ttl = live_ttl_seconds
+            if not ttl:
+                return fn(self, *args, **kwargs)
+
+            # Tushare与AkShare返回的列不同，数据源也作为键的一部分
+            source = 'tushare' if getattr(self, 'pro', None) is not None else 'akshare'
+            raw_key = json.dumps([fn.__qualname__, source, params], sort_keys=True, default=str)
+            path = os.path.join(CACHE_DIR, namespace, hashlib.md5(raw_key.encode('utf-8')).hexdigest() + '.parquet')
+
+            try:
+                if time.time() - os.path.getmtime(path) < ttl:
+                    return pd.read_parquet(path)
+            except Exception:
+                # 未命中或缓存损坏，重新获取
+                pass
+
+            df = fn(self, *args, **kwargs)
+            if isinstance(df, pd.DataFrame) and not df.empty:
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    _write_parquet(df, path)
+                except Exception as e:
+                    print(f"写入缓存失败 {fn.__qualname__}: {str(e)}")
+            return df
+
+        return wrapper
+
+    return decorator
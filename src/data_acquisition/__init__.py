@@ -3,9 +3,22 @@
 Data Acquisition Module
 """
 
-from .stock_data import StockDataFetcher
-from .institution import InstitutionalDataFetcher
-from .fund_flow import FundFlowFetcher
+import importlib
+
+# 按需加载：tushare/akshare导入较慢，首次访问对应类时才导入子模块 (PEP 562)
+_LAZY_IMPORTS = {
+    'StockDataFetcher': '.stock_data',
+    'InstitutionalDataFetcher': '.institution',
+    'FundFlowFetcher': '.fund_flow',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = importlib.import_module(_LAZY_IMPORTS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     'StockDataFetcher',
@@ -0,0 +1,97 @@
+"""
+数据获取公共配置模块
+Shared Config & Tushare Client
+
+- YAML配置按路径缓存，进程内只解析一次；解析结果另存为JSON旁路文件，
+  YAML未修改时其他进程直接读取JSON，跳过较慢的YAML解析
+- Tushare Pro接口按token缓存，所有获取器共用同一实例
+- 默认起止日期的格式化结果按分钟缓存
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import yaml
+
+# 优先使用libyaml的C实现，解析速度快数倍
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+@functools.lru_cache(maxsize=8)
+def load_config(config_path: str) -> dict:
+    """
+    读取YAML配置（按路径缓存，返回的字典为共享对象，请勿修改）
+    
+    Args:
+        config_path: 配置文件路径
+    
+    Returns:
+        配置字典
+    """
+    json_path = config_path + '.cache.json'
+    try:
+        if os.path.getmtime(json_path) >= os.path.getmtime(config_path):
+            with open(json_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        # 旁路文件不存在或损坏，重新解析YAML
+        pass
+    
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = yaml.load(f, Loader=_YAML_LOADER)
+    
+    # 先写临时文件再改名，并发进程不会读到写了一半的JSON；目录不可写时忽略
+    tmp_path = f"{json_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False)
+        os.replace(tmp_path, json_path)
+    except (OSError, TypeError):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return config
+
+
+# token -> Tushare Pro接口；加锁保证多线程同时首次调用时也只初始化一次
+_PRO_APIS = {}
+_PRO_LOCK = threading.Lock()
+
+
+def get_pro_api(token: str):
+    """
+    获取Tushare Pro接口（按token缓存，进程内只初始化一次）
+    
+    Args:
+        token: Tushare token
+    
+    Returns:
+        Tushare Pro接口对象
+    """
+    with _PRO_LOCK:
+        if token not in _PRO_APIS:
+            import tushare as ts
+            ts.set_token(token)
+            _PRO_APIS[token] = ts.pro_api()
+        return _PRO_APIS[token]
+
+
+@functools.lru_cache(maxsize=16)
+def _date_str(minute_epoch: int, days: int) -> str:
+    return (datetime.fromtimestamp(minute_epoch) - timedelta(days=days)).strftime('%Y%m%d')
+
+
+def days_ago(days: int = 0) -> str:
+    """
+    N天前的日期（格式化结果按分钟缓存，循环中反复取默认日期时不再重复格式化）
+    
+    Args:
+        days: 天数，0为今天
+    
+    Returns:
+        日期字符串 (YYYYMMDD)
+    """
+    return _date_str(int(time.time()) // 60 * 60, days)
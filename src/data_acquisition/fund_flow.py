@@ -8,14 +8,78 @@ Fund Flow Data Fetcher
 - 行业资金流向
 - 概念板块资金流向
 - 个股资金流向详情
+
+tushare/akshare在首次使用时才导入，以加快服务启动
 """
 
+import threading
+import time
+
+import numpy as np
 import pandas as pd
-import tushare as ts
-import akshare as ak
-from datetime import datetime, timedelta
 from typing import Optional, List
-import yaml
+
+from .config import days_ago, get_pro_api, load_config
+
+
+class _TodayRankCache:
+    """
+    今日个股资金流排名的进程内缓存
+    
+    读取时距上次拉取超过 TTL_SECONDS 秒才同步刷新，不使用后台线程，无人读取时不发请求；
+    刷新失败时在 MAX_STALE_SECONDS 秒内仍返回旧数据，超过后抛出异常。
+    返回的DataFrame在 attrs['fetched_at'] 中记录拉取时间（Unix时间戳）
+    """
+    
+    TTL_SECONDS = 30
+    MAX_STALE_SECONDS = 300
+    
+    # (DataFrame, 拉取时间)，整体替换，读取方不会看到半更新的状态
+    entry = None
+    # 下次允许刷新的时间（刷新失败后同样等待TTL，避免每次读取都重试）
+    next_refresh = 0.0
+    lock = threading.Lock()
+    
+    @staticmethod
+    def _fetch() -> pd.DataFrame:
+        import akshare as ak
+        return ak.stock_individual_fund_flow_rank(indicator="今日")
+    
+    @classmethod
+    def _current(cls, now: float) -> pd.DataFrame:
+        """返回缓存数据，过旧或不存在时抛出异常"""
+        if cls.entry is None:
+            raise RuntimeError("资金流向排名暂无可用数据")
+        df, fetched_at = cls.entry
+        age = now - fetched_at
+        if age > cls.MAX_STALE_SECONDS:
+            raise RuntimeError(f"资金流向排名数据已过期（{age:.0f}秒前拉取）")
+        return df
+    
+    @classmethod
+    def get(cls) -> pd.DataFrame:
+        """获取缓存的排名（无可用数据或数据过期时抛出异常）"""
+        now = time.time()
+        if now < cls.next_refresh:
+            return cls._current(now)
+        
+        with cls.lock:
+            now = time.time()
+            # 等锁期间其他线程可能已完成刷新
+            if now < cls.next_refresh:
+                return cls._current(now)
+            cls.next_refresh = now + cls.TTL_SECONDS
+            try:
+                df = cls._fetch()
+            except Exception as e:
+                print(f"刷新资金流向排名失败: {str(e)}")
+                if cls.entry is None:
+                    raise
+                # 未过期时返回旧数据（attrs['fetched_at']为其拉取时间），否则抛出过期异常
+                return cls._current(now)
+            df.attrs['fetched_at'] = now
+            cls.entry = (df, now)
+            return df
 
 
 class FundFlowFetcher:
@@ -23,14 +87,12 @@ class FundFlowFetcher:
     
     def __init__(self, config_path: str = 'configs/config.yaml'):
         """初始化资金流向获取器"""
-        with open(config_path, 'r', encoding='utf-8') as f:
-            self.config = yaml.safe_load(f)
+        self.config = load_config(config_path)
         
         # 初始化Tushare
         tushare_token = self.config['data_sources']['tushare']['token']
         if tushare_token and tushare_token != 'your_tushare_token_here':
-            ts.set_token(tushare_token)
-            self.pro = ts.pro_api()
+            self.pro = get_pro_api(tushare_token)
         else:
             self.pro = None
     
@@ -52,9 +114,9 @@ class FundFlowFetcher:
             资金流向DataFrame
         """
         if not end_date:
-            end_date = datetime.now().strftime('%Y%m%d')
+            end_date = days_ago()
         if not start_date:
-            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
+            start_date = days_ago(30)
         
         try:
             if self.pro:
@@ -66,6 +128,7 @@ class FundFlowFetcher:
                 )
             else:
                 # 使用AkShare获取
+                import akshare as ak
                 symbol = stock_code.split('.')[0]
                 
                 # 自动判断市场
@@ -96,12 +159,13 @@ class FundFlowFetcher:
             实时资金流向DataFrame
         """
         try:
-            # 使用AkShare获取实时资金流向
-            df = ak.stock_individual_fund_flow_rank(indicator="今日")
+            # 今日排名短时缓存，过期后读取时刷新
+            df = _TodayRankCache.get()
             
             if stock_codes:
-                symbols = [code.split('.')[0] for code in stock_codes]
-                df = df[df['代码'].isin(symbols)]
+                symbols = [code.split('.', 1)[0] for code in stock_codes]
+                # Index.isin返回ndarray掩码（哈希表查找），避免布尔Series按索引对齐
+                df = df[pd.Index(df['代码']).isin(symbols)]
             return df
         except Exception as e:
             print(f"获取实时资金流向失败: {str(e)}")
@@ -123,8 +187,12 @@ class FundFlowFetcher:
             主力资金排名DataFrame
         """
         try:
-            # 使用AkShare获取
-            df = ak.stock_individual_fund_flow_rank(indicator=indicator)
+            if indicator == "今日":
+                df = _TodayRankCache.get()
+            else:
+                # 使用AkShare获取
+                import akshare as ak
+                df = ak.stock_individual_fund_flow_rank(indicator=indicator)
             return df.head(top_n)
         except Exception as e:
             print(f"获取主力资金排名失败: {str(e)}")
@@ -145,6 +213,7 @@ class FundFlowFetcher:
             板块资金流向DataFrame
         """
         try:
+            import akshare as ak
             if sector_type == "industry":
                 # 行业资金流向
                 df = ak.stock_sector_fund_flow_rank(indicator="今日", sector_type="行业资金流")
@@ -175,6 +244,7 @@ class FundFlowFetcher:
             市场资金流向DataFrame
         """
         try:
+            import akshare as ak
             # 使用AkShare获取大盘资金流向
             df = ak.stock_market_fund_flow()
             return df
@@ -197,8 +267,8 @@ class FundFlowFetcher:
         Returns:
             资金流向分析结果
         """
-        end_date = datetime.now().strftime('%Y%m%d')
-        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y%m%d')
+        end_date = days_ago()
+        start_date = days_ago(days)
         
         # 获取资金流向数据
         df = self.get_individual_flow(stock_code, start_date, end_date)
@@ -216,18 +286,18 @@ class FundFlowFetcher:
             'signals': []
         }
         
+        # 所需列一次性汇总（NaN按0处理，与Series.sum一致）
+        sum_cols = [c for c in ('net_mf_amount', 'buy_elg_amount', 'buy_lg_amount') if c in df.columns]
+        sum_map = dict(zip(sum_cols, np.nansum(df[sum_cols].to_numpy(dtype=np.float64), axis=0)))
+        
         # 计算主力资金净流入
         if 'net_mf_amount' in df.columns:
-            total_net_inflow = df['net_mf_amount'].sum()
+            total_net_inflow = sum_map['net_mf_amount']
             result['total_main_net_inflow'] = total_net_inflow
             
-            # 连续净流入天数
-            consecutive_inflow = 0
-            for value in df['net_mf_amount']:
-                if value > 0:
-                    consecutive_inflow += 1
-                else:
-                    break
+            # 连续净流入天数：第一个非正值（含NaN）的位置即连续天数
+            not_inflow = ~(df['net_mf_amount'].to_numpy(dtype=np.float64) > 0)
+            consecutive_inflow = int(np.argmax(not_inflow)) if not_inflow.any() else len(not_inflow)
             result['consecutive_inflow_days'] = consecutive_inflow
             
             # 判断信号
@@ -240,8 +310,8 @@ class FundFlowFetcher:
         
         # 分析超大单和大单
         if 'buy_elg_amount' in df.columns and 'buy_lg_amount' in df.columns:
-            super_large_buy = df['buy_elg_amount'].sum()
-            large_buy = df['buy_lg_amount'].sum()
+            super_large_buy = sum_map['buy_elg_amount']
+            large_buy = sum_map['buy_lg_amount']
             result['super_large_buy'] = super_large_buy
             result['large_buy'] = large_buy
             
@@ -273,9 +343,10 @@ class FundFlowFetcher:
             龙虎榜资金流向DataFrame
         """
         if not trade_date:
-            trade_date = datetime.now().strftime('%Y%m%d')
+            trade_date = days_ago()
         
         try:
+            import akshare as ak
             # 使用AkShare获取龙虎榜资金流向
             df = ak.stock_lhb_detail_em(date=trade_date)
             return df
@@ -303,13 +374,9 @@ class FundFlowFetcher:
         # 获取今日主力资金排名
         df = self.get_main_flow_rank(indicator="今日", top_n=500)
         
-        # 筛选条件
-        if '主力净流入' in df.columns:
-            df = df[df['主力净流入'] > min_inflow]
-        
-        # 按主力净流入排序
+        # 筛选后按主力净流入取前N名（nlargest为部分排序，无需整表排序）
         if '主力净流入' in df.columns:
-            df = df.sort_values('主力净流入', ascending=False)
+            return df[df['主力净流入'] > min_inflow].nlargest(top_n, '主力净流入')
         
         return df.head(top_n)
     
@@ -328,8 +395,8 @@ class FundFlowFetcher:
         Returns:
             资金流向历史DataFrame
         """
-        end_date = datetime.now().strftime('%Y%m%d')
-        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y%m%d')
+        end_date = days_ago()
+        start_date = days_ago(days)
         
         df = self.get_individual_flow(stock_code, start_date, end_date)
         
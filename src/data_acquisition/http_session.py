@@ -0,0 +1,40 @@
+"""
+共享HTTP会话模块
+Shared HTTP Session
+
+本项目自己发起的HTTP请求通过 get_session() 复用带连接池与重试的Session，
+保持keep-alive连接，避免每次请求重新进行TCP/TLS握手。
+
+不替换 requests 的模块级请求函数：那会让进程内所有库的 requests.get/post
+共用同一个cookie与重试策略。requests.Session 也不保证线程安全（每次响应都会修改cookie），
+因此每个线程各用一个Session。
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    """
+    获取当前线程的共享Session（首次调用时创建）
+    
+    Returns:
+        配置了连接池与重试的requests.Session
+    """
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=8,
+            max_retries=Retry(total=2, backoff_factor=0.1)
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _local.session = session
+    return session
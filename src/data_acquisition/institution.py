@@ -11,12 +11,34 @@ Institutional Data Fetcher
 - 机构调研数据
 """
 
+import numpy as np
 import pandas as pd
-import tushare as ts
 import akshare as ak
-from datetime import datetime, timedelta
-from typing import Optional, List
-import yaml
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict
+
+from src.cache import disk_cache
+from src.utils import fast_concat
+from .config import days_ago, get_pro_api, load_config
+
+
+def future_result(future, stock_code: str, label: str):
+    """
+    取出并发请求的结果，失败时打印原因并返回None（单项失败不影响其余数据）
+    
+    Args:
+        future: 请求对应的Future
+        stock_code: 股票代码（用于错误信息）
+        label: 数据名称（用于错误信息）
+    
+    Returns:
+        请求结果，失败时为None
+    """
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"获取{label}数据失败 {stock_code}: {str(e)}")
+        return None
 
 
 class InstitutionalDataFetcher:
@@ -24,14 +46,12 @@ class InstitutionalDataFetcher:
     
     def __init__(self, config_path: str = 'configs/config.yaml'):
         """初始化机构数据获取器"""
-        with open(config_path, 'r', encoding='utf-8') as f:
-            self.config = yaml.safe_load(f)
+        self.config = load_config(config_path)
         
         # 初始化Tushare
         tushare_token = self.config['data_sources']['tushare']['token']
         if tushare_token and tushare_token != 'your_tushare_token_here':
-            ts.set_token(tushare_token)
-            self.pro = ts.pro_api()
+            self.pro = get_pro_api(tushare_token)
         else:
             self.pro = None
     
@@ -61,6 +81,7 @@ class InstitutionalDataFetcher:
         df = self.pro.fund_portfolio(ts_code=stock_code)
         return df
     
+    @disk_cache(ttl_seconds=3600, namespace='top_list', live_ttl_seconds=3600, date_arg='trade_date')
     def get_top_list(
         self,
         trade_date: Optional[str] = None,
@@ -77,7 +98,7 @@ class InstitutionalDataFetcher:
             龙虎榜DataFrame
         """
         if not trade_date:
-            trade_date = datetime.now().strftime('%Y%m%d')
+            trade_date = days_ago()
         
         if self.pro:
             # 使用Tushare获取
@@ -107,7 +128,7 @@ class InstitutionalDataFetcher:
             机构席位DataFrame
         """
         if not trade_date:
-            trade_date = datetime.now().strftime('%Y%m%d')
+            trade_date = days_ago()
         
         if self.pro:
             df = self.pro.top_inst(trade_date=trade_date, ts_code=stock_code)
@@ -138,9 +159,9 @@ class InstitutionalDataFetcher:
             大宗交易DataFrame
         """
         if not end_date:
-            end_date = datetime.now().strftime('%Y%m%d')
+            end_date = days_ago()
         if not start_date:
-            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
+            start_date = days_ago(30)
         
         if self.pro:
             df = self.pro.block_trade(
@@ -170,22 +191,14 @@ class InstitutionalDataFetcher:
             北向资金持股DataFrame
         """
         if not trade_date:
-            trade_date = datetime.now().strftime('%Y%m%d')
+            trade_date = days_ago()
         
         if self.pro:
-            # 获取沪股通持股
-            df_sh = self.pro.hk_hold(
-                ts_code=stock_code,
-                trade_date=trade_date,
-                exchange='SH'
-            )
-            # 获取深股通持股
-            df_sz = self.pro.hk_hold(
-                ts_code=stock_code,
-                trade_date=trade_date,
-                exchange='SZ'
-            )
-            df = pd.concat([df_sh, df_sz], ignore_index=True)
+            # 沪股通、深股通持股并发获取
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                sh_future = executor.submit(self.pro.hk_hold, ts_code=stock_code, trade_date=trade_date, exchange='SH')
+                sz_future = executor.submit(self.pro.hk_hold, ts_code=stock_code, trade_date=trade_date, exchange='SZ')
+            df = fast_concat([sh_future.result(), sz_future.result()])
         else:
             # 使用AkShare获取
             df = ak.stock_em_hsgt_hold_stock(symbol="北向")
@@ -211,9 +224,9 @@ class InstitutionalDataFetcher:
             北向资金流向DataFrame
         """
         if not end_date:
-            end_date = datetime.now().strftime('%Y%m%d')
+            end_date = days_ago()
         if not start_date:
-            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y%m%d')
+            start_date = days_ago(30)
         
         if self.pro:
             df = self.pro.moneyflow_hsgt(
@@ -226,6 +239,7 @@ class InstitutionalDataFetcher:
         
         return df
     
+    @disk_cache(ttl_seconds=3600, namespace='margin_detail', live_ttl_seconds=3600)
     def get_margin_detail(
         self,
         stock_code: str,
@@ -244,9 +258,9 @@ class InstitutionalDataFetcher:
             融资融券DataFrame
         """
         if not end_date:
-            end_date = datetime.now().strftime('%Y%m%d')
+            end_date = days_ago()
         if not start_date:
-            start_date = (datetime.now() - timedelta(days=90)).strftime('%Y%m%d')
+            start_date = days_ago(90)
         
         if self.pro:
             df = self.pro.margin_detail(
@@ -279,9 +293,9 @@ class InstitutionalDataFetcher:
             机构调研DataFrame
         """
         if not end_date:
-            end_date = datetime.now().strftime('%Y%m%d')
+            end_date = days_ago()
         if not start_date:
-            start_date = (datetime.now() - timedelta(days=90)).strftime('%Y%m%d')
+            start_date = days_ago(90)
         
         # 使用AkShare获取机构调研数据
         df = ak.stock_jgdy_tj_em(symbol="全部")
@@ -330,8 +344,8 @@ class InstitutionalDataFetcher:
         Returns:
             机构行为分析结果字典
         """
-        end_date = datetime.now().strftime('%Y%m%d')
-        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y%m%d')
+        end_date = days_ago()
+        start_date = days_ago(days)
         
         result = {
             'stock_code': stock_code,
@@ -339,54 +353,56 @@ class InstitutionalDataFetcher:
             'institutional_signals': []
         }
         
+        # 四类数据互不依赖，并发请求，总耗时取决于最慢的一次而非四次之和
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            lhb_future = executor.submit(self.get_top_inst, stock_code=stock_code)
+            nb_future = executor.submit(self.get_northbound_holdings, stock_code=stock_code)
+            margin_future = executor.submit(self.get_margin_detail, stock_code, start_date, end_date)
+            research_future = executor.submit(self.get_institutional_research, stock_code, start_date, end_date)
+        
         # 1. 龙虎榜机构席位分析
-        try:
-            lhb_data = self.get_top_inst(stock_code=stock_code)
-            if not lhb_data.empty:
-                inst_buy = lhb_data['buy'].sum() if 'buy' in lhb_data.columns else 0
-                inst_sell = lhb_data['sell'].sum() if 'sell' in lhb_data.columns else 0
-                result['lhb_inst_net_buy'] = inst_buy - inst_sell
-                
-                if inst_buy > inst_sell * 1.5:
-                    result['institutional_signals'].append('龙虎榜机构大幅净买入')
-        except:
-            pass
+        lhb_data = future_result(lhb_future, stock_code, '龙虎榜机构席位')
+        if lhb_data is not None and not lhb_data.empty:
+            # 买卖两列一次性汇总（NaN按0处理，与Series.sum一致）
+            trade_cols = [c for c in ('buy', 'sell') if c in lhb_data.columns]
+            trade_sums = dict(zip(trade_cols, np.nansum(lhb_data[trade_cols].to_numpy(dtype=np.float64), axis=0)))
+            inst_buy = trade_sums.get('buy', 0)
+            inst_sell = trade_sums.get('sell', 0)
+            result['lhb_inst_net_buy'] = inst_buy - inst_sell
+            
+            if inst_buy > inst_sell * 1.5:
+                result['institutional_signals'].append('龙虎榜机构大幅净买入')
         
         # 2. 北向资金分析
-        try:
-            nb_holdings = self.get_northbound_holdings(stock_code=stock_code)
-            if not nb_holdings.empty and len(nb_holdings) > 1:
-                latest_hold = nb_holdings.iloc[0]['hold_amount'] if 'hold_amount' in nb_holdings.columns else 0
-                prev_hold = nb_holdings.iloc[-1]['hold_amount'] if 'hold_amount' in nb_holdings.columns else 0
-                change_pct = (latest_hold - prev_hold) / prev_hold * 100 if prev_hold > 0 else 0
-                result['northbound_change_pct'] = change_pct
-                
-                threshold = self.config['institutional_detection']['northbound_change_threshold']
-                if change_pct > threshold:
-                    result['institutional_signals'].append(f'北向资金增持 {change_pct:.2f}%')
-        except:
-            pass
+        nb_holdings = future_result(nb_future, stock_code, '北向资金持股')
+        if nb_holdings is not None and len(nb_holdings) > 1:
+            if 'hold_amount' in nb_holdings.columns:
+                # 直接取数组首尾元素，避免iloc构造整行Series
+                hold = nb_holdings['hold_amount'].to_numpy()
+                latest_hold, prev_hold = hold[0], hold[-1]
+            else:
+                latest_hold = prev_hold = 0
+            change_pct = (latest_hold - prev_hold) / prev_hold * 100 if prev_hold > 0 else 0
+            result['northbound_change_pct'] = change_pct
+            
+            threshold = self.config['institutional_detection']['northbound_change_threshold']
+            if change_pct > threshold:
+                result['institutional_signals'].append(f'北向资金增持 {change_pct:.2f}%')
         
         # 3. 融资融券分析
-        try:
-            margin_data = self.get_margin_detail(stock_code, start_date, end_date)
-            if not margin_data.empty:
-                avg_margin_balance = margin_data['rzye'].mean() if 'rzye' in margin_data.columns else 0
-                result['avg_margin_balance'] = avg_margin_balance
-        except:
-            pass
+        margin_data = future_result(margin_future, stock_code, '融资融券')
+        if margin_data is not None and not margin_data.empty:
+            avg_margin_balance = np.nanmean(margin_data['rzye'].to_numpy(dtype=np.float64)) if 'rzye' in margin_data.columns else 0
+            result['avg_margin_balance'] = avg_margin_balance
         
         # 4. 机构调研频次
-        try:
-            research_data = self.get_institutional_research(stock_code, start_date, end_date)
-            if not research_data.empty:
-                research_count = len(research_data)
-                result['research_count'] = research_count
-                
-                if research_count > 5:
-                    result['institutional_signals'].append(f'近{days}日机构调研{research_count}次')
-        except:
-            pass
+        research_data = future_result(research_future, stock_code, '机构调研')
+        if research_data is not None and not research_data.empty:
+            research_count = len(research_data)
+            result['research_count'] = research_count
+            
+            if research_count > 5:
+                result['institutional_signals'].append(f'近{days}日机构调研{research_count}次')
         
         # 综合评分
         signal_count = len(result['institutional_signals'])
@@ -398,6 +414,27 @@ class InstitutionalDataFetcher:
             result['institutional_activity'] = '低'
         
         return result
+    
+    def analyze_many(
+        self,
+        stock_codes: List[str],
+        days: int = 30,
+        max_workers: int = 16
+    ) -> Dict[str, dict]:
+        """
+        批量分析多只股票的机构行为
+        
+        Args:
+            stock_codes: 股票代码列表
+            days: 分析天数
+            max_workers: 同时进行的网络请求上限（每只股票并发4个请求）
+        
+        Returns:
+            {股票代码: 机构行为分析结果字典}
+        """
+        with ThreadPoolExecutor(max_workers=max(1, max_workers // 4)) as executor:
+            results = executor.map(lambda code: self.analyze_institutional_behavior(code, days), stock_codes)
+            return dict(zip(stock_codes, results))
 
 
 if __name__ == '__main__':
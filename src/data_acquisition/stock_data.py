@@ -8,12 +8,131 @@ Stock Market Data Fetcher
 - yfinance
 """
 
+import threading
+import time
+
+import numpy as np
 import pandas as pd
-import tushare as ts
 import akshare as ak
-from datetime import datetime, timedelta
-from typing import Optional, List
-import yaml
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional, List, Dict
+
+try:
+    import polars as pl
+except ImportError:  # Polars为可选依赖，未安装时批量拆分使用pandas
+    pl = None
+
+from src.cache import disk_cache
+from src.utils import fast_concat
+from .config import days_ago, get_pro_api, load_config
+
+
+# 代码首位 -> 交易所后缀
+_EXCHANGE_SUFFIX = {'6': '.SH', '0': '.SZ', '3': '.SZ', '8': '.BJ', '4': '.BJ'}
+
+# 交易所后缀 -> 新浪代码前缀（新浪不支持北交所）
+_SINA_PREFIX = {'SH': 'sh', 'SZ': 'sz'}
+
+# 东方财富日线列名：中文 -> 英文
+_EM_COL_MAP = {
+    '日期': 'trade_date',
+    '股票代码': 'ts_code',
+    '开盘': 'open',
+    '收盘': 'close',
+    '最高': 'high',
+    '最低': 'low',
+    '成交量': 'vol',
+    '成交额': 'amount',
+    '振幅': 'amplitude',
+    '涨跌幅': 'pct_chg',
+    '涨跌额': 'change',
+    '换手率': 'turnover_rate'
+}
+
+# 实时快照缓存：同一行情刷新周期（约3秒）内复用
+_SPOT_TTL_SECONDS = 3
+_SPOT_CACHE = {'time': 0.0, 'df': None, 'lock': threading.Lock()}
+
+# 进程内股票列表缓存：数据源(Tushare接口或None) -> (日期, DataFrame)，每天只读一次磁盘缓存/网络
+_STOCK_LISTS = {}
+_STOCK_LIST_LOCK = threading.Lock()
+
+# 降精度时仍保持float64的列（成交额可达1e10以上，超出float32有效位数）
+_KEEP_FLOAT64 = frozenset({'amount'})
+
+
+def _downcast_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    数值列降精度：float64 -> float32，int64 -> 可容纳取值的最窄整数类型
+    
+    float32约7位有效数字，价格等字段精度足够，但下游显示/计算会出现细微差异，
+    因此仅在调用方显式要求时使用
+    
+    Args:
+        df: 行情DataFrame
+    
+    Returns:
+        降精度后的DataFrame
+    """
+    if df.empty:
+        return df
+    
+    float_cols = [c for c in df.select_dtypes('float64').columns if c not in _KEEP_FLOAT64]
+    if float_cols:
+        df[float_cols] = df[float_cols].astype(np.float32)
+    
+    int_cols = df.select_dtypes('int64').columns.tolist()
+    if int_cols:
+        df[int_cols] = df[int_cols].apply(pd.to_numeric, downcast='integer')
+    return df
+
+
+class _BufferedDailyFetch:
+    """
+    缓冲的日线数据请求代理
+    
+    get_daily_data 只登记请求并返回Future，flush时统一并发获取
+    """
+    
+    def __init__(self, fetcher: 'StockDataFetcher'):
+        self._fetcher = fetcher
+        self._pending = []
+    
+    def get_daily_data(
+        self,
+        stock_code: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Future:
+        """登记一次日线数据请求，返回结果Future"""
+        future = Future()
+        self._pending.append((future, stock_code, start_date, end_date))
+        return future
+    
+    def flush(self, max_workers: int = 8):
+        """并发执行所有已登记的请求"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        
+        def run(item):
+            future, stock_code, start_date, end_date = item
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self._fetcher.get_daily_data(stock_code, start_date, end_date))
+            except Exception as e:
+                future.set_exception(e)
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+            list(executor.map(run, pending))
+    
+    def cancel(self):
+        """取消所有尚未执行的请求，等待中的 result() 调用抛出CancelledError"""
+        pending, self._pending = self._pending, []
+        for future, *_ in pending:
+            future.cancel()
 
 
 class StockDataFetcher:
@@ -26,21 +145,37 @@ class StockDataFetcher:
         Args:
             config_path: 配置文件路径
         """
-        with open(config_path, 'r', encoding='utf-8') as f:
-            self.config = yaml.safe_load(f)
+        self.config = load_config(config_path)
         
         # 初始化Tushare
         tushare_token = self.config['data_sources']['tushare']['token']
         if tushare_token and tushare_token != 'your_tushare_token_here':
-            ts.set_token(tushare_token)
-            self.pro = ts.pro_api()
+            self.pro = get_pro_api(tushare_token)
         else:
             self.pro = None
             print("警告: Tushare token未配置，部分功能将不可用")
     
     def get_stock_list(self) -> pd.DataFrame:
         """
-        获取股票列表
+        获取股票列表（进程内缓存，所有获取器实例共用）
+        
+        Returns:
+            股票列表DataFrame（副本，调用方可自由修改）
+        """
+        today = days_ago()
+        with _STOCK_LIST_LOCK:
+            cached_date, df = _STOCK_LISTS.get(self.pro, (None, None))
+            if cached_date != today:
+                df = self._fetch_stock_list()
+                # 获取失败（空表）不缓存，下次调用重试
+                if not df.empty:
+                    _STOCK_LISTS[self.pro] = (today, df)
+        return df.copy()
+    
+    @disk_cache(ttl_seconds=7 * 24 * 3600, namespace='stock_list')
+    def _fetch_stock_list(self) -> pd.DataFrame:
+        """
+        从Tushare/AkShare获取股票列表
         
         Returns:
             股票列表DataFrame
@@ -57,13 +192,21 @@ class StockDataFetcher:
             df = ak.stock_info_a_code_name()
             df.columns = ['ts_code', 'name']
         
+        # 地区、行业等列取值重复度高，转为category以节省内存并加速分组
+        for col in ('area', 'industry', 'market', 'exchange'):
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        
         return df
     
+    @disk_cache(ttl_seconds=24 * 3600, namespace='daily', live_ttl_seconds=300)
     def get_daily_data(
         self,
         stock_code: str,
         start_date: Optional[str] = None,
-        end_date: Optional[str] = None
+        end_date: Optional[str] = None,
+        downcast: bool = False,
+        parse_dates: bool = False
     ) -> pd.DataFrame:
         """
         获取股票日线数据
@@ -72,6 +215,8 @@ class StockDataFetcher:
             stock_code: 股票代码（如：600519.SH 或 600519）
             start_date: 开始日期 (YYYYMMDD)
             end_date: 结束日期 (YYYYMMDD)
+            downcast: 是否将数值列降为float32/较窄整数以节省内存（amount保持float64）
+            parse_dates: trade_date是否保留为datetime64（默认为YYYYMMDD字符串）
         
         Returns:
             日线数据DataFrame
@@ -82,9 +227,9 @@ class StockDataFetcher:
         
         # 默认获取最近1年数据
         if not end_date:
-            end_date = datetime.now().strftime('%Y%m%d')
+            end_date = days_ago()
         if not start_date:
-            start_date = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
+            start_date = days_ago(365)
         
         if self.pro:
             # 使用Tushare获取
@@ -93,6 +238,8 @@ class StockDataFetcher:
                 start_date=start_date,
                 end_date=end_date
             )
+            if parse_dates and not df.empty:
+                df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d', cache=True)
         else:
             # 使用AkShare获取
             symbol = stock_code.split('.')[0]
@@ -109,36 +256,18 @@ class StockDataFetcher:
                 
                 # 标准化列名：中文 -> 英文
                 if not df.empty:
-                    column_mapping = {
-                        '日期': 'trade_date',
-                        '股票代码': 'ts_code',
-                        '开盘': 'open',
-                        '收盘': 'close',
-                        '最高': 'high',
-                        '最低': 'low',
-                        '成交量': 'vol',
-                        '成交额': 'amount',
-                        '振幅': 'amplitude',
-                        '涨跌幅': 'pct_chg',
-                        '涨跌额': 'change',
-                        '换手率': 'turnover_rate'
-                    }
-                    df = df.rename(columns=column_mapping)
+                    df.columns = [_EM_COL_MAP.get(c, c) for c in df.columns]
             except Exception as e:
                 print(f"Eastmoney获取失败，尝试Sina: {str(e)}")
                 try:
                     # 备用：新浪财经 (Sina)
                     # 转换代码格式: 600519.SH -> sh600519
-                    sina_symbol = stock_code.lower().replace('.', '')
-                    if sina_symbol.endswith('bj'):
+                    code_part, _, exchange = stock_code.partition('.')
+                    sina_prefix = _SINA_PREFIX.get(exchange.upper())
+                    if sina_prefix is None:
                         # Sina可能不支持北交所或者格式不同，暂时忽略
-                        raise ValueError("Sina不支持北交所")
-                    
-                    # 调整sina_symbol顺序: 600519sh -> sh600519
-                    if sina_symbol.endswith('sh'):
-                        sina_symbol = 'sh' + sina_symbol[:-2]
-                    elif sina_symbol.endswith('sz'):
-                        sina_symbol = 'sz' + sina_symbol[:-2]
+                        raise ValueError(f"Sina不支持该市场: {stock_code}")
+                    sina_symbol = sina_prefix + code_part
                     
                     df = ak.stock_zh_a_daily(
                         symbol=sina_symbol,
@@ -167,20 +296,150 @@ class StockDataFetcher:
             
             # 通用处理
             if not df.empty:
-                # 转换日期格式为 YYYYMMDD
+                # 解析日期（东方财富、新浪均为 YYYY-MM-DD，指定格式免去逐值推断）
                 if 'trade_date' in df.columns:
-                    df['trade_date'] = pd.to_datetime(df['trade_date']).dt.strftime('%Y%m%d')
+                    df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y-%m-%d', cache=True)
                 
-                # 确保数值列为float类型
-                numeric_cols = ['open', 'close', 'high', 'low', 'vol', 'amount']
-                for col in numeric_cols:
-                    if col in df.columns:
-                        df[col] = pd.to_numeric(df[col], errors='coerce')
+                # 确保数值列为数值类型（一次性转换并整体写回）
+                numeric_cols = [c for c in ('open', 'close', 'high', 'low', 'vol', 'amount') if c in df.columns]
+                df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce')
                 
-                # 按日期降序排列（最新的在前面）
+                # 按日期降序排列（最新的在前面），datetime64按整数比较，先排序再格式化
                 df = df.sort_values('trade_date', ascending=False).reset_index(drop=True)
+                
+                # 默认转换为 YYYYMMDD 字符串，与Tushare格式一致
+                if not parse_dates and 'trade_date' in df.columns:
+                    df['trade_date'] = df['trade_date'].dt.strftime('%Y%m%d')
         
-        return df
+        return _downcast_numeric(df) if downcast else df
+    
+    def get_daily_data_batch(
+        self,
+        stock_codes: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        max_workers: int = 8
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        并发获取多只股票日线数据
+        
+        数据获取以网络I/O为主，使用线程池并发请求以隐藏单次请求延迟
+        
+        Args:
+            stock_codes: 股票代码列表
+            start_date: 开始日期 (YYYYMMDD)
+            end_date: 结束日期 (YYYYMMDD)
+            max_workers: 最大并发线程数
+        
+        Returns:
+            {股票代码: 日线数据DataFrame}，获取失败的股票对应空DataFrame
+        """
+        with self.buffered_fetch(max_workers) as bf:
+            futures = {code: bf.get_daily_data(code, start_date, end_date) for code in stock_codes}
+        
+        results = {}
+        for code, future in futures.items():
+            try:
+                results[code] = future.result()
+            except Exception as e:
+                print(f"获取 {code} 日线数据失败: {str(e)}")
+                results[code] = pd.DataFrame()
+        return results
+    
+    def get_daily_bulk(
+        self,
+        stock_codes: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        max_workers: int = 8
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        按交易日批量获取多只股票日线数据
+        
+        Tushare的 daily(trade_date=...) 一次返回全市场当日行情，
+        请求次数取决于交易日数而非股票数，适合大批量股票（如回测数据准备）。
+        未配置Tushare时退化为逐只并发获取。
+        
+        Args:
+            stock_codes: 股票代码列表
+            start_date: 开始日期 (YYYYMMDD)
+            end_date: 结束日期 (YYYYMMDD)
+            max_workers: 最大并发线程数（受接口频率限制，不宜过大）
+        
+        Returns:
+            {股票代码: 日线数据DataFrame}（日期降序），无数据的股票对应空DataFrame
+        """
+        if not self.pro:
+            return self.get_daily_data_batch(stock_codes, start_date, end_date, max_workers)
+        
+        if not end_date:
+            end_date = days_ago()
+        if not start_date:
+            start_date = days_ago(365)
+        
+        # 交易日历
+        cal = self.pro.trade_cal(exchange='SSE', start_date=start_date, end_date=end_date, is_open='1')
+        trade_dates = cal['cal_date'].tolist() if not cal.empty else []
+        
+        def fetch_day(trade_date):
+            try:
+                return self.pro.daily(trade_date=trade_date)
+            except Exception as e:
+                print(f"获取 {trade_date} 全市场日线失败: {str(e)}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            all_daily = fast_concat(executor.map(fetch_day, trade_dates))
+        
+        normalized = dict(zip(stock_codes, self._normalize_stock_codes(stock_codes)))
+        results = {code: pd.DataFrame() for code in stock_codes}
+        if all_daily.empty:
+            return results
+        
+        # 只保留请求的股票，再按代码拆分
+        wanted = list(set(normalized.values()))
+        if pl is not None:
+            # Polars的过滤/排序/分组为多线程实现，全市场多日数据量大时明显快于pandas
+            parts = (
+                pl.from_pandas(all_daily)
+                .filter(pl.col('ts_code').is_in(wanted))
+                .sort('trade_date', descending=True)
+                .partition_by('ts_code', as_dict=True)
+            )
+            # 新版Polars的键为元组
+            groups = {(key[0] if isinstance(key, tuple) else key): part.to_pandas() for key, part in parts.items()}
+        else:
+            all_daily = all_daily[all_daily['ts_code'].isin(wanted)]
+            all_daily = all_daily.sort_values('trade_date', ascending=False)
+            groups = {ts_code: group.reset_index(drop=True) for ts_code, group in all_daily.groupby('ts_code', sort=False)}
+        
+        for code, ts_code in normalized.items():
+            if ts_code in groups:
+                results[code] = groups[ts_code]
+        return results
+    
+    @contextmanager
+    def buffered_fetch(self, max_workers: int = 8):
+        """
+        缓冲批量获取日线数据
+        
+        在上下文内调用 get_daily_data 只登记请求并返回Future，
+        退出上下文时一次性并发获取，将N次串行请求合并为一轮
+        
+        Args:
+            max_workers: 最大并发线程数
+        
+        Yields:
+            请求代理对象，其 get_daily_data 返回 Future
+        """
+        buffer = _BufferedDailyFetch(self)
+        try:
+            yield buffer
+        except BaseException:
+            # 上下文内出错时不再发起请求，取消已返回的Future，避免等待其结果的调用永久阻塞
+            buffer.cancel()
+            raise
+        buffer.flush(max_workers)
     
     def get_realtime_data(self, stock_codes: List[str]) -> pd.DataFrame:
         """
@@ -197,17 +456,35 @@ class StockDataFetcher:
             codes_str = ','.join(stock_codes)
             df = self.pro.realtime_quote(ts_code=codes_str)
         else:
-            # 使用AkShare获取
-            df = ak.stock_zh_a_spot_em()
-            df = df[df['代码'].isin([code.split('.')[0] for code in stock_codes])]
+            # 使用AkShare获取全市场快照（短时缓存），按代码索引后直接取所需行，结果保持请求顺序
+            spot = self._get_spot_snapshot()
+            wanted = [code.split('.', 1)[0] for code in stock_codes]
+            df = spot.reindex(wanted).dropna(how='all').reset_index()
         
         return df
     
+    def _get_spot_snapshot(self) -> pd.DataFrame:
+        """
+        获取以'代码'为索引的A股实时快照
+        
+        同一行情刷新周期内的重复调用直接复用上次结果，不再重新下载全市场数据
+        
+        Returns:
+            实时行情DataFrame（索引为'代码'）
+        """
+        with _SPOT_CACHE['lock']:
+            now = time.monotonic()
+            if _SPOT_CACHE['df'] is None or now - _SPOT_CACHE['time'] > _SPOT_TTL_SECONDS:
+                _SPOT_CACHE['df'] = ak.stock_zh_a_spot_em().set_index('代码')
+                _SPOT_CACHE['time'] = now
+            return _SPOT_CACHE['df']
+    
     def get_minute_data(
         self,
         stock_code: str,
         freq: str = '5min',
-        start_date: Optional[str] = None
+        start_date: Optional[str] = None,
+        downcast: bool = False
     ) -> pd.DataFrame:
         """
         获取分钟级数据
@@ -216,6 +493,7 @@ class StockDataFetcher:
             stock_code: 股票代码
             freq: 频率 (1min, 5min, 15min, 30min, 60min)
             start_date: 开始日期
+            downcast: 是否将数值列降为float32/较窄整数以节省内存
         
         Returns:
             分钟数据DataFrame
@@ -238,8 +516,9 @@ class StockDataFetcher:
             adjust="qfq"
         )
         
-        return df
+        return _downcast_numeric(df) if downcast else df
     
+    @disk_cache(ttl_seconds=24 * 3600, namespace='financial')
     def get_financial_data(self, stock_code: str, report_type: str = 'balance') -> pd.DataFrame:
         """
         获取财务数据
@@ -277,20 +556,29 @@ class StockDataFetcher:
         Returns:
             标准化后的代码 (如: 600519.SH)
         """
-        if code.startswith('6'):
-            return f"{code}.SH"
-        elif code.startswith('0') or code.startswith('3'):
-            return f"{code}.SZ"
-        elif code.startswith('8') or code.startswith('4'):
-            return f"{code}.BJ"
-        else:
-            return code
+        return code + _EXCHANGE_SUFFIX.get(code[:1], '')
+    
+    def _normalize_stock_codes(self, codes) -> pd.Series:
+        """
+        批量标准化股票代码（向量化，已带后缀的代码保持不变）
+        
+        Args:
+            codes: 股票代码列表或Series
+        
+        Returns:
+            标准化后的代码Series
+        """
+        s = pd.Series(codes, dtype=str)
+        suffix = s.str[:1].map(_EXCHANGE_SUFFIX).fillna('').astype(str)
+        return s.where(s.str.contains('.', regex=False), s + suffix)
     
+    @disk_cache(ttl_seconds=24 * 3600, namespace='index_daily', live_ttl_seconds=300)
     def get_index_data(
         self,
         index_code: str = '000001.SH',
         start_date: Optional[str] = None,
-        end_date: Optional[str] = None
+        end_date: Optional[str] = None,
+        downcast: bool = False
     ) -> pd.DataFrame:
         """
         获取指数数据
@@ -299,14 +587,15 @@ class StockDataFetcher:
             index_code: 指数代码 (000001.SH: 上证指数, 399001.SZ: 深证成指)
             start_date: 开始日期
             end_date: 结束日期
+            downcast: 是否将数值列降为float32/较窄整数以节省内存
         
         Returns:
             指数数据DataFrame
         """
         if not end_date:
-            end_date = datetime.now().strftime('%Y%m%d')
+            end_date = days_ago()
         if not start_date:
-            start_date = (datetime.now() - timedelta(days=365)).strftime('%Y%m%d')
+            start_date = days_ago(365)
         
         if self.pro:
             df = self.pro.index_daily(
@@ -319,7 +608,7 @@ class StockDataFetcher:
             symbol = index_code.split('.')[0]
             df = ak.stock_zh_index_daily(symbol=f"sh{symbol}")
         
-        return df
+        return _downcast_numeric(df) if downcast else df
 
 
 if __name__ == '__main__':
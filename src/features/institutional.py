@@ -12,22 +12,59 @@ Institutional Behavior Features
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Optional
-import yaml
+from typing import Optional, List, Dict
+from concurrent.futures import ThreadPoolExecutor
 import sys
 sys.path.append('.')
 
-from src.data_acquisition.institution import InstitutionalDataFetcher
+from src.data_acquisition.config import load_config
+from src.data_acquisition.institution import InstitutionalDataFetcher, future_result
 from src.data_acquisition.fund_flow import FundFlowFetcher
 
 
+# 资金流向特征用到的数值列
+_FLOW_COLUMNS = ['net_mf_amount', 'buy_elg_amount', 'sell_elg_amount', 'buy_lg_amount', 'sell_lg_amount']
+
+
+# 资金流向特征的默认值（对应无数据）
+_EMPTY_FLOW_FEATURES = {
+    'main_net_inflow_total': 0,
+    'main_net_inflow_mean': 0,
+    'main_net_inflow_std': 0,
+    'consecutive_inflow_days': 0,
+    'inflow_ratio': 0,
+    'super_large_buy_total': 0,
+    'super_large_sell_total': 0,
+    'super_large_net': 0,
+    'large_buy_total': 0,
+    'large_sell_total': 0,
+    'large_net': 0
+}
+
+# 机构行为特征的默认值（对应数据缺失或获取失败）
+_EMPTY_INST_FEATURES = {
+    'lhb_appear_count': 0,
+    'lhb_inst_buy': 0,
+    'lhb_inst_sell': 0,
+    'lhb_inst_net': 0,
+    'northbound_holdings': 0,
+    'northbound_change': 0,
+    'northbound_change_pct': 0,
+    'margin_balance_mean': 0,
+    'margin_buy_mean': 0,
+    'research_count': 0
+}
+
+
 class InstitutionalFeatures:
     """机构行为特征提取器"""
     
+    # 特征列名（资金流向特征 + 机构行为特征），与默认值字典的键顺序一致
+    _FEATURE_COLUMNS = tuple(_EMPTY_FLOW_FEATURES) + tuple(_EMPTY_INST_FEATURES)
+    
     def __init__(self, config_path: str = 'configs/config.yaml'):
         """初始化机构特征提取器"""
-        with open(config_path, 'r', encoding='utf-8') as f:
-            self.config = yaml.safe_load(f)
+        self.config = load_config(config_path)
         
         self.inst_fetcher = InstitutionalDataFetcher(config_path)
         self.flow_fetcher = FundFlowFetcher(config_path)
@@ -58,34 +95,33 @@ class InstitutionalFeatures:
         if df.empty:
             return self._get_empty_flow_features()
         
+        # 所需列的汇总统计一次算出（按列计算 sum/mean/std；AkShare数据不含这些列）
+        flow_cols = df.columns.intersection(_FLOW_COLUMNS)
+        stats = df[flow_cols].agg(['sum', 'mean', 'std']) if len(flow_cols) else None
+        
         # 主力资金净流入特征
         if 'net_mf_amount' in df.columns:
-            features['main_net_inflow_total'] = df['net_mf_amount'].sum()
-            features['main_net_inflow_mean'] = df['net_mf_amount'].mean()
-            features['main_net_inflow_std'] = df['net_mf_amount'].std()
+            features['main_net_inflow_total'] = stats.at['sum', 'net_mf_amount']
+            features['main_net_inflow_mean'] = stats.at['mean', 'net_mf_amount']
+            features['main_net_inflow_std'] = stats.at['std', 'net_mf_amount']
             
-            # 连续净流入天数
-            consecutive_days = 0
-            for value in df['net_mf_amount']:
-                if value > 0:
-                    consecutive_days += 1
-                else:
-                    break
-            features['consecutive_inflow_days'] = consecutive_days
+            # 连续净流入天数：从首行（最新）起第一个非正值（含NaN）的位置
+            inflow = df['net_mf_amount'].to_numpy(dtype=np.float64) > 0
+            features['consecutive_inflow_days'] = int(np.argmin(inflow)) if not inflow.all() else len(inflow)
             
-            # 净流入占比（正值天数/总天数）
-            features['inflow_ratio'] = (df['net_mf_amount'] > 0).sum() / len(df)
+            # 净流入占比（正值天数/总天数），复用同一掩码
+            features['inflow_ratio'] = inflow.mean()
         
         # 超大单特征
         if 'buy_elg_amount' in df.columns:
-            features['super_large_buy_total'] = df['buy_elg_amount'].sum()
-            features['super_large_sell_total'] = df['sell_elg_amount'].sum() if 'sell_elg_amount' in df.columns else 0
+            features['super_large_buy_total'] = stats.at['sum', 'buy_elg_amount']
+            features['super_large_sell_total'] = stats.at['sum', 'sell_elg_amount'] if 'sell_elg_amount' in df.columns else 0
             features['super_large_net'] = features['super_large_buy_total'] - features['super_large_sell_total']
         
         # 大单特征
         if 'buy_lg_amount' in df.columns:
-            features['large_buy_total'] = df['buy_lg_amount'].sum()
-            features['large_sell_total'] = df['sell_lg_amount'].sum() if 'sell_lg_amount' in df.columns else 0
+            features['large_buy_total'] = stats.at['sum', 'buy_lg_amount']
+            features['large_sell_total'] = stats.at['sum', 'sell_lg_amount'] if 'sell_lg_amount' in df.columns else 0
             features['large_net'] = features['large_buy_total'] - features['large_sell_total']
         
         return features
@@ -110,67 +146,47 @@ class InstitutionalFeatures:
         end_date = datetime.now().strftime('%Y%m%d')
         start_date = (datetime.now() - timedelta(days=days)).strftime('%Y%m%d')
         
+        # 四类数据互不依赖，并发请求，总耗时取决于最慢的一次而非四次之和
+        fetcher = self.inst_fetcher
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            lhb_future = executor.submit(fetcher.get_top_inst, stock_code=stock_code)
+            nb_future = executor.submit(fetcher.get_northbound_holdings, stock_code=stock_code)
+            margin_future = executor.submit(fetcher.get_margin_detail, stock_code, start_date, end_date)
+            research_future = executor.submit(fetcher.get_institutional_research, stock_code, start_date, end_date)
+        
+        # 缺失数据时各项特征默认为0
+        features.update(_EMPTY_INST_FEATURES)
+        
         # 1. 龙虎榜特征
-        try:
-            lhb_data = self.inst_fetcher.get_top_inst(stock_code=stock_code)
-            if not lhb_data.empty:
-                features['lhb_appear_count'] = len(lhb_data)
-                features['lhb_inst_buy'] = lhb_data['buy'].sum() if 'buy' in lhb_data.columns else 0
-                features['lhb_inst_sell'] = lhb_data['sell'].sum() if 'sell' in lhb_data.columns else 0
-                features['lhb_inst_net'] = features['lhb_inst_buy'] - features['lhb_inst_sell']
-            else:
-                features['lhb_appear_count'] = 0
-                features['lhb_inst_buy'] = 0
-                features['lhb_inst_sell'] = 0
-                features['lhb_inst_net'] = 0
-        except:
-            features['lhb_appear_count'] = 0
-            features['lhb_inst_buy'] = 0
-            features['lhb_inst_sell'] = 0
-            features['lhb_inst_net'] = 0
+        lhb_data = future_result(lhb_future, stock_code, '龙虎榜机构席位')
+        if lhb_data is not None and not lhb_data.empty:
+            features['lhb_appear_count'] = len(lhb_data)
+            features['lhb_inst_buy'] = lhb_data['buy'].sum() if 'buy' in lhb_data.columns else 0
+            features['lhb_inst_sell'] = lhb_data['sell'].sum() if 'sell' in lhb_data.columns else 0
+            features['lhb_inst_net'] = features['lhb_inst_buy'] - features['lhb_inst_sell']
         
         # 2. 北向资金特征
-        try:
-            nb_holdings = self.inst_fetcher.get_northbound_holdings(stock_code=stock_code)
-            if not nb_holdings.empty:
-                latest_hold = nb_holdings.iloc[0]['hold_amount'] if 'hold_amount' in nb_holdings.columns else 0
-                features['northbound_holdings'] = latest_hold
-                
-                if len(nb_holdings) > 1:
-                    prev_hold = nb_holdings.iloc[-1]['hold_amount'] if 'hold_amount' in nb_holdings.columns else 0
-                    features['northbound_change'] = latest_hold - prev_hold
-                    features['northbound_change_pct'] = (latest_hold - prev_hold) / prev_hold * 100 if prev_hold > 0 else 0
-                else:
-                    features['northbound_change'] = 0
-                    features['northbound_change_pct'] = 0
-            else:
-                features['northbound_holdings'] = 0
-                features['northbound_change'] = 0
-                features['northbound_change_pct'] = 0
-        except:
-            features['northbound_holdings'] = 0
-            features['northbound_change'] = 0
-            features['northbound_change_pct'] = 0
+        nb_holdings = future_result(nb_future, stock_code, '北向资金持股')
+        if nb_holdings is not None and not nb_holdings.empty and 'hold_amount' in nb_holdings.columns:
+            hold = nb_holdings['hold_amount'].to_numpy()
+            latest_hold = hold[0]
+            features['northbound_holdings'] = latest_hold
+            
+            if len(hold) > 1:
+                prev_hold = hold[-1]
+                features['northbound_change'] = latest_hold - prev_hold
+                features['northbound_change_pct'] = (latest_hold - prev_hold) / prev_hold * 100 if prev_hold > 0 else 0
         
         # 3. 融资融券特征
-        try:
-            margin_data = self.inst_fetcher.get_margin_detail(stock_code, start_date, end_date)
-            if not margin_data.empty:
-                features['margin_balance_mean'] = margin_data['rzye'].mean() if 'rzye' in margin_data.columns else 0
-                features['margin_buy_mean'] = margin_data['rzmre'].mean() if 'rzmre' in margin_data.columns else 0
-            else:
-                features['margin_balance_mean'] = 0
-                features['margin_buy_mean'] = 0
-        except:
-            features['margin_balance_mean'] = 0
-            features['margin_buy_mean'] = 0
+        margin_data = future_result(margin_future, stock_code, '融资融券')
+        if margin_data is not None and not margin_data.empty:
+            features['margin_balance_mean'] = margin_data['rzye'].mean() if 'rzye' in margin_data.columns else 0
+            features['margin_buy_mean'] = margin_data['rzmre'].mean() if 'rzmre' in margin_data.columns else 0
         
         # 4. 机构调研特征
-        try:
-            research_data = self.inst_fetcher.get_institutional_research(stock_code, start_date, end_date)
-            features['research_count'] = len(research_data) if not research_data.empty else 0
-        except:
-            features['research_count'] = 0
+        research_data = future_result(research_future, stock_code, '机构调研')
+        if research_data is not None:
+            features['research_count'] = len(research_data)
         
         return features
     
@@ -191,31 +207,43 @@ class InstitutionalFeatures:
         """
         features = {}
         
+        # 资金流向与机构行为两部分并发提取
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            flow_future = executor.submit(self.extract_fund_flow_features, stock_code, days)
+            inst_future = executor.submit(self.extract_institutional_features, stock_code, days)
+        
         # 资金流向特征
-        flow_features = self.extract_fund_flow_features(stock_code, days)
-        features.update(flow_features)
+        features.update(flow_future.result())
         
         # 机构行为特征
-        inst_features = self.extract_institutional_features(stock_code, days)
-        features.update(inst_features)
+        features.update(inst_future.result())
         
         return features
     
+    def extract_many(
+        self,
+        stock_codes: List[str],
+        days: int = 30,
+        max_workers: int = 16
+    ) -> Dict[str, dict]:
+        """
+        批量提取多只股票的机构相关特征
+        
+        Args:
+            stock_codes: 股票代码列表
+            days: 历史天数
+            max_workers: 同时进行的网络请求上限（每只股票并发5个请求）
+        
+        Returns:
+            {股票代码: 特征字典}
+        """
+        with ThreadPoolExecutor(max_workers=max(1, max_workers // 5)) as executor:
+            results = executor.map(lambda code: self.extract_all_features(code, days), stock_codes)
+            return dict(zip(stock_codes, results))
+    
     def _get_empty_flow_features(self) -> dict:
         """返回空的资金流向特征"""
-        return {
-            'main_net_inflow_total': 0,
-            'main_net_inflow_mean': 0,
-            'main_net_inflow_std': 0,
-            'consecutive_inflow_days': 0,
-            'inflow_ratio': 0,
-            'super_large_buy_total': 0,
-            'super_large_sell_total': 0,
-            'super_large_net': 0,
-            'large_buy_total': 0,
-            'large_sell_total': 0,
-            'large_net': 0
-        }
+        return dict(_EMPTY_FLOW_FEATURES)
     
     def get_feature_columns(self) -> list:
         """
@@ -224,31 +252,7 @@ class InstitutionalFeatures:
         Returns:
             特征列名列表
         """
-        return [
-            # 资金流向特征
-            'main_net_inflow_total',
-            'main_net_inflow_mean',
-            'main_net_inflow_std',
-            'consecutive_inflow_days',
-            'inflow_ratio',
-            'super_large_buy_total',
-            'super_large_sell_total',
-            'super_large_net',
-            'large_buy_total',
-            'large_sell_total',
-            'large_net',
-            # 机构行为特征
-            'lhb_appear_count',
-            'lhb_inst_buy',
-            'lhb_inst_sell',
-            'lhb_inst_net',
-            'northbound_holdings',
-            'northbound_change',
-            'northbound_change_pct',
-            'margin_balance_mean',
-            'margin_buy_mean',
-            'research_count'
-        ]
+        return list(self._FEATURE_COLUMNS)
 
 
 if __name__ == '__main__':
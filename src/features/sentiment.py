@@ -12,16 +12,127 @@ Market Sentiment Features
 import pandas as pd
 import numpy as np
 from typing import Optional
-import yaml
+
+from src.data_acquisition.config import load_config
+from src.utils import add_columns, njit, rolling_max_min, rolling_mean_std, sort_by
+
+# _price_kernel 输出矩阵的列顺序
+_KERNEL_COLUMNS = (
+    'amplitude', 'amplitude_ma_5', 'amplitude_ma_20', 'amplitude_ratio',
+    'volatility_5', 'volatility_20', 'volatility_ratio',
+    'momentum_3', 'momentum_5', 'momentum_10', 'momentum_20', 'acceleration_5'
+)
+_AMPLITUDE_COLUMNS = _KERNEL_COLUMNS[:4]
+_VOLATILITY_COLUMNS = _KERNEL_COLUMNS[4:7]
+_MOMENTUM_COLUMNS = _KERNEL_COLUMNS[7:]
+
+# 动量的N日周期（与 _MOMENTUM_COLUMNS 中的 momentum_N 对应）
+_MOMENTUM_PERIODS = np.array([3, 5, 10, 20], dtype=np.int64)
+
+# 价格位置的窗口长度
+_POSITION_WINDOWS = np.array([5, 10, 20, 60], dtype=np.int64)
+
+
+@njit(cache=True, error_model='numpy')
+def _price_kernel(high: np.ndarray, low: np.ndarray, close: np.ndarray, momentum_periods: np.ndarray) -> np.ndarray:
+    """
+    振幅、波动率与动量特征的编译内核
+    
+    一次遍历收盘价同时得到日振幅、日收益率和各周期N日涨跌幅（不前向填充缺失值），
+    再在编译代码内完成滑动均值/标准差，不产生中间Series
+    
+    Args:
+        high: 最高价数组
+        low: 最低价数组
+        close: 收盘价数组
+        momentum_periods: 动量周期数组
+    
+    Returns:
+        (N, 12)矩阵，列顺序见 _KERNEL_COLUMNS
+    """
+    n = len(close)
+    m_count = len(momentum_periods)
+    out = np.full((n, 7 + m_count + 1), np.nan)
+    amplitude = np.full(n, np.nan)
+    returns = np.full(n, np.nan)
+    for i in range(1, n):
+        prev_close = close[i - 1]
+        amplitude[i] = (high[i] - low[i]) / prev_close * 100
+        returns[i] = close[i] / prev_close - 1
+        for k in range(m_count):
+            period = momentum_periods[k]
+            if i >= period:
+                out[i, 7 + k] = (close[i] / close[i - period] - 1) * 100
+    
+    amplitude_ma_5, _ = rolling_mean_std(amplitude, 5)
+    amplitude_ma_20, _ = rolling_mean_std(amplitude, 20)
+    _, returns_std_5 = rolling_mean_std(returns, 5)
+    _, returns_std_20 = rolling_mean_std(returns, 20)
+    
+    # 年化波动率（%）
+    annualize = np.sqrt(252.0) * 100
+    out[:, 0] = amplitude
+    out[:, 1] = amplitude_ma_5
+    out[:, 2] = amplitude_ma_20
+    out[:, 3] = amplitude / amplitude_ma_20
+    out[:, 4] = returns_std_5 * annualize
+    out[:, 5] = returns_std_20 * annualize
+    out[:, 6] = out[:, 4] / out[:, 5]
+    
+    # 加速度（5日动量的变化），按周期查找5日动量所在列，周期数组中没有5时保持NaN
+    for k in range(m_count):
+        if momentum_periods[k] == 5:
+            col = 7 + k
+            out[1:, 7 + m_count] = out[1:, col] - out[:-1, col]
+            break
+    return out
 
 
 class MarketSentiment:
     """市场情绪特征提取器"""
     
+    # 特征列名
+    _FEATURE_COLUMNS = (
+        # 换手率特征
+        'turnover_ma_5', 'turnover_ma_20', 'turnover_ratio',
+        # 量比特征
+        'volume_ratio', 'volume_change',
+        # 振幅特征
+        'amplitude', 'amplitude_ma_5', 'amplitude_ma_20', 'amplitude_ratio',
+        # 动量特征
+        'momentum_3', 'momentum_5', 'momentum_10', 'momentum_20', 'acceleration_5',
+        # 波动率特征
+        'volatility_5', 'volatility_20', 'volatility_ratio',
+        # 价格位置特征
+        'price_position_5', 'price_position_10', 'price_position_20', 'price_position_60',
+        # 趋势强度特征
+        'trend_strength_5', 'trend_strength_10', 'trend_strength_20'
+    )
+    
     def __init__(self, config_path: str = 'configs/config.yaml'):
         """初始化市场情绪提取器"""
-        with open(config_path, 'r', encoding='utf-8') as f:
-            self.config = yaml.safe_load(f)
+        self.config = load_config(config_path)
+    
+    def _turnover_columns(self, df: pd.DataFrame) -> dict:
+        """换手率特征列"""
+        cols = {}
+        turnover_rate = df['turnover_rate'] if 'turnover_rate' in df.columns else None
+        
+        if turnover_rate is None:
+            # 如果没有换手率，尝试计算
+            if 'volume' in df.columns and 'total_share' in df.columns:
+                turnover_rate = cols['turnover_rate'] = df['volume'] / df['total_share'] * 100
+        
+        if turnover_rate is not None:
+            # 换手率移动平均
+            turnover = turnover_rate.to_numpy(dtype=np.float64)
+            cols['turnover_ma_5'], _ = rolling_mean_std(turnover, 5)
+            cols['turnover_ma_20'], _ = rolling_mean_std(turnover, 20)
+            
+            # 换手率相对强度
+            cols['turnover_ratio'] = turnover / cols['turnover_ma_20']
+        
+        return cols
     
     def calculate_turnover_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -33,20 +144,25 @@ class MarketSentiment:
         Returns:
             添加了换手率特征的DataFrame
         """
-        if 'turnover_rate' not in df.columns:
-            # 如果没有换手率，尝试计算
-            if 'volume' in df.columns and 'total_share' in df.columns:
-                df['turnover_rate'] = df['volume'] / df['total_share'] * 100
-        
-        if 'turnover_rate' in df.columns:
-            # 换手率移动平均
-            df['turnover_ma_5'] = df['turnover_rate'].rolling(window=5).mean()
-            df['turnover_ma_20'] = df['turnover_rate'].rolling(window=20).mean()
+        return add_columns(df, self._turnover_columns(df))
+    
+    def _volume_ratio_columns(self, df: pd.DataFrame) -> dict:
+        """量比特征列"""
+        cols = {}
+        if 'volume' in df.columns:
+            # 5日平均成交量（已由技术指标计算时直接复用）
+            if 'vol_ma_5' in df.columns:
+                vol_ma_5 = df['vol_ma_5']
+            else:
+                vol_ma_5 = df['volume'].rolling(window=5).mean()
             
-            # 换手率相对强度
-            df['turnover_ratio'] = df['turnover_rate'] / df['turnover_ma_20']
+            # 量比 = 当日成交量 / 5日平均成交量
+            cols['volume_ratio'] = df['volume'] / vol_ma_5
+            
+            # 成交量变化率
+            cols['volume_change'] = df['volume'].pct_change() * 100
         
-        return df
+        return cols
     
     def calculate_volume_ratio(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -58,17 +174,29 @@ class MarketSentiment:
         Returns:
             添加了量比特征的DataFrame
         """
-        if 'volume' in df.columns:
-            # 5日平均成交量
-            vol_ma_5 = df['volume'].rolling(window=5).mean()
-            
-            # 量比 = 当日成交量 / 5日平均成交量
-            df['volume_ratio'] = df['volume'] / vol_ma_5
-            
-            # 成交量变化率
-            df['volume_change'] = df['volume'].pct_change() * 100
+        return add_columns(df, self._volume_ratio_columns(df))
+    
+    def _price_kernel_columns(self, df: pd.DataFrame) -> dict:
+        """振幅、波动率与动量特征列（一次内核调用）；缺少high/low时不含振幅"""
+        if 'close' not in df.columns:
+            return {}
         
-        return df
+        close = df['close'].to_numpy(dtype=np.float64)
+        has_range = 'high' in df.columns and 'low' in df.columns
+        if has_range:
+            high = df['high'].to_numpy(dtype=np.float64)
+            low = df['low'].to_numpy(dtype=np.float64)
+        else:
+            high = low = np.full(len(close), np.nan)
+        
+        matrix = _price_kernel(high, low, close, _MOMENTUM_PERIODS)
+        names = _KERNEL_COLUMNS if has_range else _VOLATILITY_COLUMNS + _MOMENTUM_COLUMNS
+        return {name: matrix[:, _KERNEL_COLUMNS.index(name)] for name in names}
+    
+    def _amplitude_columns(self, df: pd.DataFrame) -> dict:
+        """振幅特征列"""
+        cols = self._price_kernel_columns(df)
+        return {name: cols[name] for name in _AMPLITUDE_COLUMNS if name in cols}
     
     def calculate_amplitude_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -80,18 +208,12 @@ class MarketSentiment:
         Returns:
             添加了振幅特征的DataFrame
         """
-        if all(col in df.columns for col in ['high', 'low', 'close']):
-            # 日振幅
-            df['amplitude'] = (df['high'] - df['low']) / df['close'].shift(1) * 100
-            
-            # 平均振幅
-            df['amplitude_ma_5'] = df['amplitude'].rolling(window=5).mean()
-            df['amplitude_ma_20'] = df['amplitude'].rolling(window=20).mean()
-            
-            # 振幅相对强度
-            df['amplitude_ratio'] = df['amplitude'] / df['amplitude_ma_20']
-        
-        return df
+        return add_columns(df, self._amplitude_columns(df))
+    
+    def _momentum_columns(self, df: pd.DataFrame) -> dict:
+        """动量特征列"""
+        cols = self._price_kernel_columns(df)
+        return {name: cols[name] for name in _MOMENTUM_COLUMNS if name in cols}
     
     def calculate_momentum_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -103,15 +225,12 @@ class MarketSentiment:
         Returns:
             添加了动量特征的DataFrame
         """
-        if 'close' in df.columns:
-            # 动量指标（N日涨跌幅）
-            for n in [3, 5, 10, 20]:
-                df[f'momentum_{n}'] = df['close'].pct_change(periods=n) * 100
-            
-            # 加速度（动量的变化率）
-            df['acceleration_5'] = df['momentum_5'].diff()
-        
-        return df
+        return add_columns(df, self._momentum_columns(df))
+    
+    def _volatility_columns(self, df: pd.DataFrame) -> dict:
+        """波动率特征列"""
+        cols = self._price_kernel_columns(df)
+        return {name: cols[name] for name in _VOLATILITY_COLUMNS if name in cols}
     
     def calculate_volatility_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -123,18 +242,28 @@ class MarketSentiment:
         Returns:
             添加了波动率特征的DataFrame
         """
-        if 'close' in df.columns:
-            # 收益率
-            returns = df['close'].pct_change()
-            
-            # 历史波动率（标准差）
-            df['volatility_5'] = returns.rolling(window=5).std() * np.sqrt(252) * 100
-            df['volatility_20'] = returns.rolling(window=20).std() * np.sqrt(252) * 100
+        return add_columns(df, self._volatility_columns(df))
+    
+    def _price_position_columns(self, df: pd.DataFrame) -> dict:
+        """价格位置特征列"""
+        cols = {}
+        if all(col in df.columns for col in ['close', 'high', 'low']):
+            # 计算N日最高价和最低价（所有窗口一次遍历）
+            high_n, low_n = rolling_max_min(
+                df['high'].to_numpy(dtype=np.float64),
+                df['low'].to_numpy(dtype=np.float64),
+                _POSITION_WINDOWS
+            )
             
-            # 波动率比率
-            df['volatility_ratio'] = df['volatility_5'] / df['volatility_20']
+            # 价格在N日区间的位置（0-100）；区间宽度为0（横盘）时记为0，窗口未满时保持NaN
+            close = df['close'].to_numpy(dtype=np.float64)[:, None]
+            price_range = high_n - low_n
+            position = np.where(np.isnan(price_range), np.nan, 0.0)
+            np.divide((close - low_n) * 100, price_range, out=position, where=price_range > 0)
+            for k, n in enumerate(_POSITION_WINDOWS):
+                cols[f'price_position_{n}'] = position[:, k]
         
-        return df
+        return cols
     
     def calculate_price_position(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -146,16 +275,19 @@ class MarketSentiment:
         Returns:
             添加了价格位置特征的DataFrame
         """
-        if all(col in df.columns for col in ['close', 'high', 'low']):
-            # 计算N日最高价和最低价
-            for n in [5, 10, 20, 60]:
-                high_n = df['high'].rolling(window=n).max()
-                low_n = df['low'].rolling(window=n).min()
-                
-                # 价格在N日区间的位置（0-100）
-                df[f'price_position_{n}'] = (df['close'] - low_n) / (high_n - low_n) * 100
+        return add_columns(df, self._price_position_columns(df))
+    
+    def _trend_strength_columns(self, df: pd.DataFrame) -> dict:
+        """趋势强度特征列"""
+        cols = {}
+        if 'close' in df.columns:
+            # ADX (Average Directional Index) 简化版
+            # 使用收盘价的移动平均斜率作为趋势强度
+            for n in [5, 10, 20]:
+                ma = df[f'ma_{n}'] if f'ma_{n}' in df.columns else df['close'].rolling(window=n).mean()
+                cols[f'trend_strength_{n}'] = (ma - ma.shift(n)) / ma.shift(n) * 100
         
-        return df
+        return cols
     
     def calculate_trend_strength(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -167,46 +299,44 @@ class MarketSentiment:
         Returns:
             添加了趋势强度特征的DataFrame
         """
-        if 'close' in df.columns:
-            # ADX (Average Directional Index) 简化版
-            # 使用收盘价的移动平均斜率作为趋势强度
-            for n in [5, 10, 20]:
-                ma = df['close'].rolling(window=n).mean()
-                df[f'trend_strength_{n}'] = (ma - ma.shift(n)) / ma.shift(n) * 100
-        
-        return df
+        return add_columns(df, self._trend_strength_columns(df))
     
-    def calculate_all_sentiment_features(self, df: pd.DataFrame) -> pd.DataFrame:
+    def calculate_all_sentiment_features(self, df: pd.DataFrame, downcast: bool = False) -> pd.DataFrame:
         """
         计算所有市场情绪特征
         
+        传入 TechnicalIndicators.calculate_all_indicators 的结果时，
+        复用其中已有的均线和成交量均线，避免重复滚动计算
+        
         Args:
-            df: 原始数据DataFrame
+            df: 原始数据或已含技术指标的DataFrame
+            downcast: 是否将新增的特征列存为float32以节省内存（计算过程仍为float64）
         
         Returns:
             包含所有情绪特征的DataFrame
         """
-        df = df.copy()
-        
         # 确保按日期升序排序（计算指标需要从旧到新）
         if 'trade_date' in df.columns:
-            df = df.sort_values('trade_date', ascending=True).reset_index(drop=True)
+            df = sort_by(df, 'trade_date', ascending=True)
         elif 'date' in df.columns:
-            df = df.sort_values('date', ascending=True).reset_index(drop=True)
+            df = sort_by(df, 'date', ascending=True)
         
-        df = self.calculate_turnover_features(df)
-        df = self.calculate_volume_ratio(df)
-        df = self.calculate_amplitude_features(df)
-        df = self.calculate_momentum_features(df)
-        df = self.calculate_volatility_features(df)
-        df = self.calculate_price_position(df)
-        df = self.calculate_trend_strength(df)
+        # 先收集所有新列，最后一次性合并（返回新对象，调用方的DataFrame不会被修改，无需预先复制）
+        out = {}
+        out.update(self._turnover_columns(df))
+        out.update(self._volume_ratio_columns(df))
+        out.update(self._price_kernel_columns(df))
+        out.update(self._price_position_columns(df))
+        out.update(self._trend_strength_columns(df))
+        if downcast:
+            out = {name: np.asarray(values, dtype=np.float32) for name, values in out.items()}
+        df = add_columns(df, out)
         
         # 计算完成后，按日期降序排列（最新的在前面）
         if 'trade_date' in df.columns:
-            df = df.sort_values('trade_date', ascending=False).reset_index(drop=True)
+            df = sort_by(df, 'trade_date', ascending=False)
         elif 'date' in df.columns:
-            df = df.sort_values('date', ascending=False).reset_index(drop=True)
+            df = sort_by(df, 'date', ascending=False)
         
         return df
     
@@ -217,24 +347,7 @@ class MarketSentiment:
         Returns:
             特征列名列表
         """
-        features = [
-            # 换手率特征
-            'turnover_ma_5', 'turnover_ma_20', 'turnover_ratio',
-            # 量比特征
-            'volume_ratio', 'volume_change',
-            # 振幅特征
-            'amplitude', 'amplitude_ma_5', 'amplitude_ma_20', 'amplitude_ratio',
-            # 动量特征
-            'momentum_3', 'momentum_5', 'momentum_10', 'momentum_20', 'acceleration_5',
-            # 波动率特征
-            'volatility_5', 'volatility_20', 'volatility_ratio',
-            # 价格位置特征
-            'price_position_5', 'price_position_10', 'price_position_20', 'price_position_60',
-            # 趋势强度特征
-            'trend_strength_5', 'trend_strength_10', 'trend_strength_20'
-        ]
-        
-        return features
+        return list(self._FEATURE_COLUMNS)
 
 
 if __name__ == '__main__':
@@ -13,10 +13,149 @@ Technical Indicators Calculator
 等
 """
 
+from functools import cached_property
+
 import pandas as pd
 import numpy as np
 from typing import Optional
-import yaml
+
+from src.data_acquisition.config import load_config
+from src.utils import add_columns, njit, rolling_mean_std, sort_by
+
+try:
+    import talib
+except ImportError:  # TA-Lib为可选依赖，未安装时使用pandas实现
+    talib = None
+
+
+@njit(cache=True)
+def _multi_ema(x: np.ndarray, alphas: np.ndarray) -> np.ndarray:
+    """
+    一次遍历同时计算多条EMA
+    
+    每个时间点依次更新各平滑系数对应的状态，结果与
+    pandas ewm(alpha=a, adjust=False).mean() 一致（含NaN的处理方式）
+    
+    Args:
+        x: float64数组
+        alphas: 平滑系数数组
+    
+    Returns:
+        (N, K)矩阵，第k列为 alphas[k] 对应的EMA
+    """
+    n = len(x)
+    k_count = len(alphas)
+    out = np.full((n, k_count), np.nan)
+    for k in range(k_count):
+        alpha = alphas[k]
+        weighted = np.nan
+        old_wt = 1.0
+        for t in range(n):
+            cur = x[t]
+            if weighted == weighted:
+                # 已有有效值：NaN期间权重继续衰减，遇到观测值时加权更新
+                old_wt *= 1.0 - alpha
+                if cur == cur:
+                    if weighted != cur:
+                        weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+                    old_wt = 1.0
+            elif cur == cur:
+                weighted = cur
+            out[t, k] = weighted
+    return out
+
+
+@njit(cache=True)
+def _wilder_averages(close: np.ndarray, period: int):
+    """
+    Wilder平滑的平均涨幅与平均跌幅（RSI/ATR所用的递推均值）
+    
+    首个值为前period个变化的简单平均，之后 avg = (avg * (period - 1) + 当前值) / period；
+    价格缺失（NaN）的那天按无涨跌处理，不会中断递推
+    
+    Args:
+        close: 收盘价数组
+        period: 平滑周期
+    
+    Returns:
+        (平均涨幅数组, 平均跌幅数组)，前period个位置为NaN
+    """
+    n = len(close)
+    avg_gain = np.full(n, np.nan)
+    avg_loss = np.full(n, np.nan)
+    gain_state = 0.0
+    loss_state = 0.0
+    for i in range(1, n):
+        delta = close[i] - close[i - 1]
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        if i <= period:
+            gain_state += gain / period
+            loss_state += loss / period
+            if i < period:
+                continue
+        else:
+            gain_state = (gain_state * (period - 1) + gain) / period
+            loss_state = (loss_state * (period - 1) + loss) / period
+        avg_gain[i] = gain_state
+        avg_loss[i] = loss_state
+    return avg_gain, avg_loss
+
+
+def _ema_by_span(x: np.ndarray, spans) -> dict:
+    """按span计算EMA（alpha = 2 / (span + 1)），返回 span -> 数组"""
+    spans = sorted(set(spans))
+    matrix = _multi_ema(x, 2.0 / (np.asarray(spans, dtype=np.float64) + 1.0))
+    return {span: matrix[:, i] for i, span in enumerate(spans)}
+
+
+def _use_talib(values: np.ndarray) -> bool:
+    """
+    是否可以交给TA-Lib计算滚动统计量
+    
+    TA-Lib遇到NaN/无穷大后，之后所有位置都输出NaN，而pandas rolling在窗口移过缺失值后即恢复，
+    因此只有数据全部为有限值时才使用TA-Lib
+    """
+    return talib is not None and np.isfinite(values).all()
+
+
+def _rolling_mean(values: np.ndarray, period: int) -> np.ndarray:
+    """简单移动平均，TA-Lib可用且无缺失值时使用其C实现"""
+    if _use_talib(values):
+        return talib.SMA(values, timeperiod=period)
+    return pd.Series(values).rolling(window=period).mean().to_numpy()
+
+
+def _rolling_max(values: np.ndarray, period: int) -> np.ndarray:
+    """滚动最大值，TA-Lib可用且无缺失值时使用其C实现"""
+    if _use_talib(values):
+        return talib.MAX(values, timeperiod=period)
+    return pd.Series(values).rolling(window=period).max().to_numpy()
+
+
+def _rolling_min(values: np.ndarray, period: int) -> np.ndarray:
+    """滚动最小值，TA-Lib可用且无缺失值时使用其C实现"""
+    if _use_talib(values):
+        return talib.MIN(values, timeperiod=period)
+    return pd.Series(values).rolling(window=period).min().to_numpy()
+
+
+def _pct_change(values: np.ndarray, periods: int = 1) -> np.ndarray:
+    """N期变化率（与 Series.pct_change(periods) 一致，前N个位置为NaN）"""
+    out = np.full(len(values), np.nan)
+    if len(values) > periods:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[periods:] = values[periods:] / values[:-periods] - 1
+    return out
+
+
+def _ohlcv_arrays(df: pd.DataFrame) -> dict:
+    """一次性取出行情列的float64数组，供各指标计算共用"""
+    return {
+        col: df[col].to_numpy(dtype=np.float64)
+        for col in ('open', 'high', 'low', 'close', 'volume')
+        if col in df.columns
+    }
 
 
 class TechnicalIndicators:
@@ -24,11 +163,17 @@ class TechnicalIndicators:
     
     def __init__(self, config_path: str = 'configs/config.yaml'):
         """初始化技术指标计算器"""
-        with open(config_path, 'r', encoding='utf-8') as f:
-            self.config = yaml.safe_load(f)
+        self.config = load_config(config_path)
         
         self.params = self.config['features']['technical']
     
+    def _ma_columns(self, data: dict, periods: Optional[list] = None) -> dict:
+        """MA列"""
+        if periods is None:
+            periods = self.params['ma_periods']
+        
+        return {f'ma_{period}': _rolling_mean(data['close'], period) for period in periods}
+    
     def calculate_ma(self, df: pd.DataFrame, periods: Optional[list] = None) -> pd.DataFrame:
         """
         计算移动平均线
@@ -40,13 +185,15 @@ class TechnicalIndicators:
         Returns:
             添加了MA列的DataFrame
         """
+        return add_columns(df, self._ma_columns(_ohlcv_arrays(df), periods))
+    
+    def _ema_columns(self, data: dict, periods: Optional[list] = None) -> dict:
+        """EMA列"""
         if periods is None:
-            periods = self.params['ma_periods']
-        
-        for period in periods:
-            df[f'ma_{period}'] = df['close'].rolling(window=period).mean()
+            periods = self.params['ema_periods']
         
-        return df
+        emas = _ema_by_span(data['close'], periods)
+        return {f'ema_{period}': emas[period] for period in periods}
     
     def calculate_ema(self, df: pd.DataFrame, periods: Optional[list] = None) -> pd.DataFrame:
         """
@@ -59,13 +206,38 @@ class TechnicalIndicators:
         Returns:
             添加了EMA列的DataFrame
         """
-        if periods is None:
-            periods = self.params['ema_periods']
+        return add_columns(df, self._ema_columns(_ohlcv_arrays(df), periods))
+    
+    def _macd_columns(self, data: dict, emas: Optional[dict] = None) -> dict:
+        """MACD列（emas为已算好的 span -> EMA，缺少快慢线时重新计算）"""
+        params = self.params['macd_params']
+        fast, slow, signal = params[0], params[1], params[2]
         
-        for period in periods:
-            df[f'ema_{period}'] = df['close'].ewm(span=period, adjust=False).mean()
+        # 计算快线和慢线
+        if emas is None or fast not in emas or slow not in emas:
+            emas = _ema_by_span(data['close'], [fast, slow])
         
-        return df
+        # MACD线
+        macd = emas[fast] - emas[slow]
+        
+        # 信号线
+        macd_signal = _ema_by_span(macd, [signal])[signal]
+        
+        # MACD柱
+        return {'macd': macd, 'macd_signal': macd_signal, 'macd_hist': macd - macd_signal}
+    
+    def _ema_macd_columns(self, data: dict) -> dict:
+        """EMA与MACD列：所有周期的EMA在一次遍历中算出，MACD直接复用快慢线"""
+        ema_periods = self.params['ema_periods']
+        macd_params = self.params['macd_params']
+        emas = _ema_by_span(
+            data['close'],
+            list(ema_periods) + [macd_params[0], macd_params[1]]
+        )
+        
+        cols = {f'ema_{period}': emas[period] for period in ema_periods}
+        cols.update(self._macd_columns(data, emas))
+        return cols
     
     def calculate_macd(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -77,23 +249,20 @@ class TechnicalIndicators:
         Returns:
             添加了MACD相关列的DataFrame
         """
-        params = self.params['macd_params']
-        fast, slow, signal = params[0], params[1], params[2]
-        
-        # 计算快线和慢线
-        ema_fast = df['close'].ewm(span=fast, adjust=False).mean()
-        ema_slow = df['close'].ewm(span=slow, adjust=False).mean()
-        
-        # MACD线
-        df['macd'] = ema_fast - ema_slow
-        
-        # 信号线
-        df['macd_signal'] = df['macd'].ewm(span=signal, adjust=False).mean()
+        return add_columns(df, self._macd_columns(_ohlcv_arrays(df)))
+    
+    def _rsi_columns(self, data: dict, period: Optional[int] = None) -> dict:
+        """RSI列"""
+        if period is None:
+            period = self.params['rsi_period']
         
-        # MACD柱
-        df['macd_hist'] = df['macd'] - df['macd_signal']
+        # Wilder平滑的平均涨跌幅（单次遍历，不生成中间Series）
+        gain, loss = _wilder_averages(data['close'], period)
         
-        return df
+        # 计算RS和RSI（只涨不跌时RS为inf，RSI为100）
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = gain / loss
+            return {'rsi': 100 - (100 / (1 + rs))}
     
     def calculate_rsi(self, df: pd.DataFrame, period: Optional[int] = None) -> pd.DataFrame:
         """
@@ -106,21 +275,23 @@ class TechnicalIndicators:
         Returns:
             添加了RSI列的DataFrame
         """
-        if period is None:
-            period = self.params['rsi_period']
-        
-        # 计算价格变化
-        delta = df['close'].diff()
-        
-        # 分离上涨和下跌
-        gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-        
-        # 计算RS和RSI
-        rs = gain / loss
-        df['rsi'] = 100 - (100 / (1 + rs))
+        return add_columns(df, self._rsi_columns(_ohlcv_arrays(df), period))
+    
+    def _kdj_columns(self, data: dict) -> dict:
+        """KDJ列"""
+        params = self.params['kdj_params']
+        n, m1, m2 = params[0], params[1], params[2]
         
-        return df
+        # 计算RSV
+        low_min = _rolling_min(data['low'], n)
+        high_max = _rolling_max(data['high'], n)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsv = (data['close'] - low_min) / (high_max - low_min) * 100
+        
+        # 计算K、D、J（com=m-1 即 alpha=1/m）
+        kdj_k = _multi_ema(rsv, np.array([1.0 / m1]))[:, 0]
+        kdj_d = _multi_ema(kdj_k, np.array([1.0 / m2]))[:, 0]
+        return {'kdj_k': kdj_k, 'kdj_d': kdj_d, 'kdj_j': 3 * kdj_k - 2 * kdj_d}
     
     def calculate_kdj(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -132,20 +303,27 @@ class TechnicalIndicators:
         Returns:
             添加了KDJ列的DataFrame
         """
-        params = self.params['kdj_params']
-        n, m1, m2 = params[0], params[1], params[2]
+        return add_columns(df, self._kdj_columns(_ohlcv_arrays(df)))
+    
+    def _boll_columns(self, data: dict) -> dict:
+        """BOLL列"""
+        params = self.params['boll_params']
+        period, std_dev = params[0], params[1]
         
-        # 计算RSV
-        low_min = df['low'].rolling(window=n).min()
-        high_max = df['high'].rolling(window=n).max()
-        rsv = (df['close'] - low_min) / (high_max - low_min) * 100
+        # 中轨与标准差（一次遍历同时得到）
+        boll_mid, std = rolling_mean_std(data['close'], period)
         
-        # 计算K、D、J
-        df['kdj_k'] = rsv.ewm(com=m1-1, adjust=False).mean()
-        df['kdj_d'] = df['kdj_k'].ewm(com=m2-1, adjust=False).mean()
-        df['kdj_j'] = 3 * df['kdj_k'] - 2 * df['kdj_d']
+        # 上轨和下轨
+        boll_upper = boll_mid + std_dev * std
+        boll_lower = boll_mid - std_dev * std
         
-        return df
+        # 布林带宽度
+        return {
+            'boll_mid': boll_mid,
+            'boll_upper': boll_upper,
+            'boll_lower': boll_lower,
+            'boll_width': (boll_upper - boll_lower) / boll_mid
+        }
     
     def calculate_boll(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -157,23 +335,25 @@ class TechnicalIndicators:
         Returns:
             添加了BOLL列的DataFrame
         """
-        params = self.params['boll_params']
-        period, std_dev = params[0], params[1]
-        
-        # 中轨
-        df['boll_mid'] = df['close'].rolling(window=period).mean()
+        return add_columns(df, self._boll_columns(_ohlcv_arrays(df)))
+    
+    def _atr_columns(self, data: dict, period: int = 14) -> dict:
+        """ATR列"""
+        high = data['high']
+        low = data['low']
+        close = data['close']
         
-        # 标准差
-        std = df['close'].rolling(window=period).std()
+        # 前一日收盘价（首日为NaN）
+        prev_close = np.empty_like(close)
+        prev_close[:1] = np.nan
+        prev_close[1:] = close[:-1]
         
-        # 上轨和下轨
-        df['boll_upper'] = df['boll_mid'] + std_dev * std
-        df['boll_lower'] = df['boll_mid'] - std_dev * std
-        
-        # 布林带宽度
-        df['boll_width'] = (df['boll_upper'] - df['boll_lower']) / df['boll_mid']
+        # 计算True Range（fmax跳过NaN，与按行max(axis=1)一致）
+        tr = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
         
-        return df
+        # 计算ATR
+        atr, _ = rolling_mean_std(tr, period)
+        return {'atr': atr}
     
     def calculate_atr(self, df: pd.DataFrame, period: int = 14) -> pd.DataFrame:
         """
@@ -186,17 +366,21 @@ class TechnicalIndicators:
         Returns:
             添加了ATR列的DataFrame
         """
-        # 计算True Range
-        high_low = df['high'] - df['low']
-        high_close = np.abs(df['high'] - df['close'].shift())
-        low_close = np.abs(df['low'] - df['close'].shift())
-        
-        tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-        
-        # 计算ATR
-        df['atr'] = tr.rolling(window=period).mean()
-        
-        return df
+        return add_columns(df, self._atr_columns(_ohlcv_arrays(df), period))
+    
+    def _obv_columns(self, data: dict) -> dict:
+        """OBV列"""
+        close = data['close']
+        volume = data['volume']
+        
+        obv = np.zeros(len(close))
+        if len(close) > 1:
+            # 上涨加成交量、下跌减成交量，平盘（含NaN）不变，再累加
+            direction = np.sign(np.nan_to_num(np.diff(close)))
+            flow = np.where(direction != 0, direction * volume[1:], 0.0)
+            np.cumsum(flow, out=obv[1:])
+        
+        return {'obv': obv}
     
     def calculate_obv(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -208,19 +392,11 @@ class TechnicalIndicators:
         Returns:
             添加了OBV列的DataFrame
         """
-        obv = [0]
-        
-        for i in range(1, len(df)):
-            if df['close'].iloc[i] > df['close'].iloc[i-1]:
-                obv.append(obv[-1] + df['volume'].iloc[i])
-            elif df['close'].iloc[i] < df['close'].iloc[i-1]:
-                obv.append(obv[-1] - df['volume'].iloc[i])
-            else:
-                obv.append(obv[-1])
-        
-        df['obv'] = obv
-        
-        return df
+        return add_columns(df, self._obv_columns(_ohlcv_arrays(df)))
+    
+    def _volume_ma_columns(self, data: dict, periods: list = [5, 10, 20]) -> dict:
+        """成交量MA列"""
+        return {f'vol_ma_{period}': _rolling_mean(data['volume'], period) for period in periods}
     
     def calculate_volume_ma(self, df: pd.DataFrame, periods: list = [5, 10, 20]) -> pd.DataFrame:
         """
@@ -233,10 +409,26 @@ class TechnicalIndicators:
         Returns:
             添加了成交量MA列的DataFrame
         """
-        for period in periods:
-            df[f'vol_ma_{period}'] = df['volume'].rolling(window=period).mean()
+        return add_columns(df, self._volume_ma_columns(_ohlcv_arrays(df), periods))
+    
+    def _price_change_columns(self, data: dict) -> dict:
+        """价格变化列"""
+        close = data['close']
         
-        return df
+        # 日涨跌幅
+        cols = {'pct_change': _pct_change(close) * 100}
+        
+        # N日涨跌幅
+        for n in [3, 5, 10, 20]:
+            cols[f'pct_change_{n}d'] = _pct_change(close, n) * 100
+        
+        # 振幅
+        prev_close = np.full(len(close), np.nan)
+        prev_close[1:] = close[:-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cols['amplitude'] = (data['high'] - data['low']) / prev_close * 100
+        
+        return cols
     
     def calculate_price_change(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -248,32 +440,20 @@ class TechnicalIndicators:
         Returns:
             添加了价格变化列的DataFrame
         """
-        # 日涨跌幅
-        df['pct_change'] = df['close'].pct_change() * 100
-        
-        # N日涨跌幅
-        for n in [3, 5, 10, 20]:
-            df[f'pct_change_{n}d'] = df['close'].pct_change(periods=n) * 100
-        
-        # 振幅
-        df['amplitude'] = (df['high'] - df['low']) / df['close'].shift(1) * 100
-        
-        return df
+        return add_columns(df, self._price_change_columns(_ohlcv_arrays(df)))
     
-    def calculate_all_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
+    def calculate_all_indicators(self, df: pd.DataFrame, downcast: bool = False) -> pd.DataFrame:
         """
         计算所有技术指标
         
         Args:
             df: 原始OHLCV数据
+            downcast: 是否将新增的指标列存为float32以节省内存（计算过程仍为float64）
         
         Returns:
             包含所有技术指标的DataFrame
         """
-        # 确保列名统一
-        df = df.copy()
-        
-        # 标准化列名
+        # 标准化列名（rename返回新对象，无需先整表复制）
         column_mapping = {
             'trade_date': 'date',
             'vol': 'volume'
@@ -289,37 +469,37 @@ class TechnicalIndicators:
         
         # 按日期升序排序（技术指标计算需要从旧到新）
         if 'date' in df.columns:
-            df = df.sort_values('date', ascending=True).reset_index(drop=True)
+            df = sort_by(df, 'date', ascending=True)
         
-        # 计算各类指标
+        # 计算各类指标：行情列只取一次数组，先收集所有新列，最后一次性合并
         try:
-            df = self.calculate_ma(df)
-            df = self.calculate_ema(df)
-            df = self.calculate_macd(df)
-            df = self.calculate_rsi(df)
-            df = self.calculate_kdj(df)
-            df = self.calculate_boll(df)
-            df = self.calculate_atr(df)
-            df = self.calculate_obv(df)
-            df = self.calculate_volume_ma(df)
-            df = self.calculate_price_change(df)
+            data = _ohlcv_arrays(df)
+            out = {}
+            out.update(self._ma_columns(data))
+            out.update(self._ema_macd_columns(data))
+            out.update(self._rsi_columns(data))
+            out.update(self._kdj_columns(data))
+            out.update(self._boll_columns(data))
+            out.update(self._atr_columns(data))
+            out.update(self._obv_columns(data))
+            out.update(self._volume_ma_columns(data))
+            out.update(self._price_change_columns(data))
+            if downcast:
+                out = {name: values.astype(np.float32) for name, values in out.items()}
+            df = add_columns(df, out)
         except Exception as e:
             print(f"计算技术指标时出错: {str(e)}")
             raise
         
         # 计算完成后，按日期降序排列（最新的在前面）
         if 'date' in df.columns:
-            df = df.sort_values('date', ascending=False).reset_index(drop=True)
+            df = sort_by(df, 'date', ascending=False)
         
         return df
     
-    def get_feature_columns(self) -> list:
-        """
-        获取所有技术指标特征列名
-        
-        Returns:
-            特征列名列表
-        """
+    @cached_property
+    def _feature_columns(self) -> tuple:
+        """特征列名（由配置的周期参数决定，首次访问时生成）"""
         features = []
         
         # MA特征
@@ -355,7 +535,16 @@ class TechnicalIndicators:
         features.extend(['pct_change', 'pct_change_3d', 'pct_change_5d', 
                         'pct_change_10d', 'pct_change_20d', 'amplitude'])
         
-        return features
+        return tuple(features)
+    
+    def get_feature_columns(self) -> list:
+        """
+        获取所有技术指标特征列名
+        
+        Returns:
+            特征列名列表
+        """
+        return list(self._feature_columns)
 
 
 if __name__ == '__main__':
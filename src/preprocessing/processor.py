@@ -1,24 +1,147 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler, StandardScaler
+from numpy.lib.stride_tricks import sliding_window_view
 from typing import Tuple, List, Optional, Union
-import joblib
+import functools
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils import HAS_NUMBA, add_columns, njit, prange
+
+
+def _fill_missing(arr: np.ndarray) -> np.ndarray:
+    """
+    按列前向填充、后向填充缺失值，仍缺失（整列缺失）的填0
+    
+    等价于 DataFrame.ffill().bfill().fillna(0)：转置为按列连续的数组，
+    只处理含NaN的列，以"最近有效位置"的累计最大值一次取值完成填充
+    
+    Args:
+        arr: 二维float数组 (samples, features)，无穷大应已替换为NaN
+        
+    Returns:
+        填充后的数组 (samples, features)
+    """
+    columns = np.ascontiguousarray(arr.T)
+    missing = np.isnan(columns)
+    positions = np.arange(columns.shape[1])
+    
+    for j in np.flatnonzero(missing.any(axis=1)):
+        # 前向填充：每个位置取此前最近一个有效值的位置
+        idx = np.where(missing[j], 0, positions)
+        np.maximum.accumulate(idx, out=idx)
+        col = columns[j][idx]
+        
+        # 后向填充（开头的缺失）：在反转后的序列上做同样的前向填充
+        head_missing = np.isnan(col)
+        if head_missing.any():
+            idx = np.where(head_missing[::-1], 0, positions)
+            np.maximum.accumulate(idx, out=idx)
+            col = np.nan_to_num(col[::-1][idx][::-1], copy=False, nan=0.0)
+        columns[j] = col
+    
+    return columns.T
+
+
+# 不作为特征的列（非数值列和不需要的列）
+_EXCLUDE_COLS = frozenset({'trade_date', 'ts_code', 'date', 'symbol', 'code', 'name'})
+
+
+@functools.lru_cache(maxsize=64)
+def _feature_columns(columns: tuple) -> tuple:
+    """
+    从全部列名中选出特征列（按列名元组缓存，同一表结构重复调用时直接返回）
+    
+    Args:
+        columns: DataFrame的列名元组
+        
+    Returns:
+        特征列名元组
+    """
+    return tuple(col for col in columns if col not in _EXCLUDE_COLS)
+
+
+# 特征列数达到该值时按列分块并行计算最小/最大值
+_PARALLEL_MIN_COLUMNS = 64
+
+
+def _column_min_max(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按列计算最小/最大值（忽略NaN）
+    
+    各列相互独立，宽矩阵按列分块在线程池中计算（numpy的归约运算会释放GIL）
+    
+    Args:
+        values: 特征矩阵 (samples, features)
+        
+    Returns:
+        (最小值数组, 最大值数组)
+    """
+    n_features = values.shape[1]
+    n_workers = min(os.cpu_count() or 1, n_features // (_PARALLEL_MIN_COLUMNS // 4))
+    if n_features < _PARALLEL_MIN_COLUMNS or n_workers < 2:
+        return np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+    
+    def chunk_min_max(cols: slice):
+        """单个列块的最小/最大值"""
+        block = values[:, cols]
+        return np.nanmin(block, axis=0), np.nanmax(block, axis=0)
+    
+    bounds = np.linspace(0, n_features, n_workers + 1).astype(int)
+    chunks = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        mins, maxs = zip(*executor.map(chunk_min_max, chunks))
+    return np.concatenate(mins), np.concatenate(maxs)
+
+
+@njit(parallel=True, cache=True)
+def _fill_sequences(data: np.ndarray, target: np.ndarray, seq_len: int, out_x: np.ndarray, out_y: np.ndarray):
+    """
+    将滑动窗口逐个写入预分配的输出数组（按样本并行）
+    
+    最内层循环沿特征维，读写都是连续内存；按输出顺序顺序写入，
+    不对样本维分块（相邻样本的输入窗口本就重叠在缓存中，分块后写入变为跨步，窄矩阵反而更慢）
+    
+    Args:
+        data: 特征矩阵 (samples, features)
+        target: 目标向量 (samples,)
+        seq_len: 序列长度
+        out_x: 输出序列 (samples - seq_len, seq_len, features)
+        out_y: 输出目标 (samples - seq_len,)
+    """
+    n_features = data.shape[1]
+    for i in prange(out_x.shape[0]):
+        for t in range(seq_len):
+            for f in range(n_features):
+                out_x[i, t, f] = data[i + t, f]
+        out_y[i] = target[i + seq_len]
+
 
 class DataProcessor:
     """数据预处理器"""
     
-    def __init__(self, sequence_length: int = 60):
+    def __init__(self, sequence_length: int = 60, dtype: np.dtype = np.float32):
         """
         初始化预处理器
         
         Args:
             sequence_length: LSTM序列长度（时间步）
+            dtype: 归一化结果和序列特征的浮点类型（模型通常按float32计算，需要更高精度时传np.float64）
         """
         self.sequence_length = sequence_length
-        self.scaler = MinMaxScaler(feature_range=(0, 1))
+        self.dtype = np.dtype(dtype)
+        # sklearn的MinMaxScaler只在读写.pkl格式的缩放器时才导入并创建
+        self.scaler = None
         self.feature_columns = []
         
+        # 归一化参数（与MinMaxScaler的拟合属性同名），由normalize_data拟合或load_scaler加载
+        self.feature_range = (0, 1)
+        self.data_min_ = None
+        self.data_max_ = None
+        self.scale_ = None
+        self.min_ = None
+        self.n_samples_seen_ = 0
+        
     def clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         数据清洗
@@ -29,20 +152,54 @@ class DataProcessor:
         Returns:
             清洗后的DataFrame
         """
-        df = df.copy()
+        # 先按列检查：浮点列是否含NaN/无穷大，其余列（日期、代码等）是否含缺失
+        float_cols = [col for col, dtype in df.dtypes.items() if dtype.kind == 'f']
+        values = df[float_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        finite = np.isfinite(values)
+        dirty = ~finite.all(axis=0)
+        dirty_float = [col for col, is_dirty in zip(float_cols, dirty) if is_dirty]
+        # 非浮点列只有含缺失值（object列还可能含无穷大）时才需要处理
+        dirty_other = [
+            col for col, dtype in df.dtypes.items()
+            if dtype.kind != 'f' and (
+                df[col].isna().any()
+                or (dtype == object and df[col].isin([np.inf, -np.inf]).any())
+            )
+        ]
         
-        # 替换无穷大值
-        df = df.replace([np.inf, -np.inf], np.nan)
+        # 实际数据大多已无缺失，直接返回（浅复制，不复制数据）
+        if not dirty_float and not dirty_other:
+            return df.copy(deep=False)
         
-        # 处理缺失值
-        # 1. 前向填充
-        df = df.ffill()
-        # 2. 后向填充（处理开头的数据）
-        df = df.bfill()
-        # 3. 如果还有缺失（通常是整列缺失），填充0
-        df = df.fillna(0)
+        parts = [df[df.columns.difference(dirty_float + dirty_other, sort=False)]]
         
-        return df
+        # 含缺失的浮点列：取出为一个ndarray，替换无穷大后一次完成前向/后向填充和补0
+        if dirty_float:
+            arr = values[:, dirty]
+            np.nan_to_num(arr, copy=False, nan=np.nan, posinf=np.nan, neginf=np.nan)
+            filled = pd.DataFrame(_fill_missing(arr), columns=dirty_float, index=df.index)
+            
+            # float32等列恢复原dtype
+            float_dtypes = {col: dtype for col, dtype in df.dtypes[dirty_float].items() if dtype != np.float64}
+            parts.append(filled.astype(float_dtypes) if float_dtypes else filled)
+        
+        # 其余含缺失的列按原流程处理
+        if dirty_other:
+            # 替换无穷大值
+            other = df[dirty_other].replace([np.inf, -np.inf], np.nan)
+            
+            # 处理缺失值
+            # 1. 前向填充
+            other = other.ffill()
+            # 2. 后向填充（处理开头的数据）
+            other = other.bfill()
+            # 3. 如果还有缺失（通常是整列缺失），填充0
+            parts.append(other.fillna(0))
+        
+        # 按原列顺序拼回
+        df_clean = pd.concat(parts, axis=1)[df.columns]
+        
+        return df_clean
         
     def prepare_features(self, df: pd.DataFrame, target_col: str = 'close') -> Tuple[pd.DataFrame, List[str]]:
         """
@@ -55,66 +212,281 @@ class DataProcessor:
         Returns:
             (特征DataFrame, 特征列名列表)
         """
-        # 排除非数值列和不需要的列
-        exclude_cols = ['trade_date', 'ts_code', 'date', 'symbol', 'code', 'name']
-        feature_cols = [col for col in df.columns if col not in exclude_cols]
+        feature_cols = list(_feature_columns(tuple(df.columns)))
         
-        # 确保所有特征都是数值型
-        for col in feature_cols:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+        # 确保所有特征都是数值型：只转换非数值列，已是数值类型的列不再重复转换
+        features = df[feature_cols]
+        needs_convert = [col for col, dtype in features.dtypes.items() if not pd.api.types.is_numeric_dtype(dtype)]
+        if needs_convert:
+            converted = features[needs_convert].apply(pd.to_numeric, errors='coerce')
+            features = pd.concat([features.drop(columns=needs_convert), converted], axis=1)[feature_cols]
             
         self.feature_columns = feature_cols
-        return df[feature_cols], feature_cols
+        return features, feature_cols
 
-    def create_sequences(self, data: np.ndarray, target: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    def create_sequences(
+        self,
+        data: np.ndarray,
+        target: np.ndarray,
+        copy: bool = True,
+        out_x: Optional[np.ndarray] = None,
+        out_y: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
         创建时间序列数据 (用于LSTM)
         
+        以滑动窗口视图一次取出全部序列，不逐个切片拼接。
+        训练循环中反复调用时，可预先分配一次 out_x/out_y 并每次传入，
+        结果直接写入这两个数组（也可以是 torch.from_numpy 共享内存的锁页缓冲区），不再每次分配新数组
+        
         Args:
             data: 特征数据矩阵 (samples, features)
             target: 目标数据向量 (samples,)
+            copy: 是否复制为连续数组；为False时X为data上的只读跨步视图（不复制数据），y为target的切片视图
+            out_x: 预分配的序列输出数组，形状与dtype须与返回的X一致（需与out_y同时传入，此时忽略copy）
+            out_y: 预分配的目标输出数组，形状与dtype须与返回的y一致
             
         Returns:
             (X, y)
             X shape: (samples - seq_len, seq_len, features)
             y shape: (samples - seq_len,)
         """
-        X, y = [], []
-        for i in range(len(data) - self.sequence_length):
-            X.append(data[i:(i + self.sequence_length)])
-            y.append(target[i + self.sequence_length])
-            
-        return np.array(X), np.array(y)
+        data = np.asarray(data, dtype=self.dtype)
+        target = np.asarray(target)
+        n = max(len(data) - self.sequence_length, 0)
+        x_shape = (n, self.sequence_length) + data.shape[1:]
+        
+        if (out_x is None) != (out_y is None):
+            raise ValueError("out_x与out_y需同时提供")
+        if out_x is not None:
+            if out_x.shape != x_shape or out_x.dtype != data.dtype:
+                raise ValueError(f"out_x应为形状{x_shape}、类型{data.dtype}的数组，实际为{out_x.shape} {out_x.dtype}")
+            if out_y.shape != (n,) or out_y.dtype != target.dtype:
+                raise ValueError(f"out_y应为形状{(n,)}、类型{target.dtype}的数组，实际为{out_y.shape} {out_y.dtype}")
+        
+        if n == 0:
+            if out_x is not None:
+                return out_x, out_y
+            return np.empty(x_shape, dtype=data.dtype), target[:0].copy()
+        
+        # 视图形状为 (窗口数, features, seq_len)，去掉最后一个窗口（其后没有目标值）并把时间步移到第二维
+        windows = sliding_window_view(data, window_shape=self.sequence_length, axis=0)[:-1]
+        X = np.moveaxis(windows, -1, 1)
+        y = target[self.sequence_length:]
+        
+        if not copy and out_x is None:
+            return X, y
+        
+        # 需要独立的连续数组时：按最终形状一次分配输出（或使用调用方的缓冲区），
+        # 有numba则用并行内核写入，否则由numpy从视图复制
+        if out_x is None:
+            out_x = np.empty(x_shape, dtype=data.dtype)
+            out_y = np.empty(n, dtype=target.dtype)
+        if HAS_NUMBA and data.ndim == 2:
+            _fill_sequences(data, target, self.sequence_length, out_x, out_y)
+        else:
+            np.copyto(out_x, X)
+            np.copyto(out_y, y)
+        return out_x, out_y
     
-    def normalize_data(self, df: pd.DataFrame, is_training: bool = True) -> pd.DataFrame:
+    def normalize_data(
+        self,
+        df: Union[pd.DataFrame, np.ndarray],
+        is_training: bool = True,
+        return_df: bool = False
+    ) -> Union[np.ndarray, pd.DataFrame]:
         """
         数据归一化
         
         Args:
-            df: 特征DataFrame
+            df: 特征DataFrame或特征矩阵 (samples, features)
             is_training: 是否为训练模式（训练模式会fit_transform，预测模式只transform）
+            return_df: 是否包装为DataFrame返回；默认直接返回ndarray（create_sequences等下游只需要数组）
             
         Returns:
-            归一化后的DataFrame
+            归一化后的特征矩阵（return_df=True时为带原列名和索引的DataFrame）
         """
+        values = np.array(df, dtype=self.dtype, copy=True)
         if is_training:
-            scaled_data = self.scaler.fit_transform(df)
+            self._fit_scaler(values)
+        values = self.transform(values, copy=False)
+        
+        if not return_df:
+            return values
+        if isinstance(df, pd.DataFrame):
+            return pd.DataFrame(values, columns=df.columns, index=df.index, copy=False)
+        return pd.DataFrame(values, copy=False)
+    
+    def _fit_scaler(self, values: np.ndarray):
+        """
+        按列计算最小/最大值和缩放参数
+        
+        拟合结果与 MinMaxScaler.fit 相同（忽略NaN，常数列的缩放系数取1）
+        
+        Args:
+            values: 特征矩阵 (samples, features)
+        """
+        data_min, data_max = _column_min_max(values)
+        self.data_min_ = data_min.astype(np.float64)
+        self.data_max_ = data_max.astype(np.float64)
+        self.n_samples_seen_ = values.shape[0]
+        self._update_scale()
+    
+    def partial_fit(self, chunk: Union[pd.DataFrame, np.ndarray]) -> 'DataProcessor':
+        """
+        分块增量拟合归一化参数（逐块更新各列最小/最大值）
+        
+        数据量超出内存时按行分块（如逐个parquet行组或CSV块）依次调用，
+        工作集只有单个块的大小；全部调用完成后再用 transform 逐块归一化
+        
+        Args:
+            chunk: 一块特征数据 (rows, features)
+            
+        Returns:
+            self
+        """
+        values = np.asarray(chunk, dtype=self.dtype)
+        chunk_min, chunk_max = _column_min_max(values)
+        if self.data_min_ is None or self.n_samples_seen_ == 0:
+            self.data_min_ = chunk_min.astype(np.float64)
+            self.data_max_ = chunk_max.astype(np.float64)
         else:
-            scaled_data = self.scaler.transform(df)
+            # fmin/fmax忽略NaN，整块缺失的列不会覆盖已有结果
+            np.fmin(self.data_min_, chunk_min, out=self.data_min_)
+            np.fmax(self.data_max_, chunk_max, out=self.data_max_)
+        self.n_samples_seen_ += values.shape[0]
+        self._update_scale()
+        return self
+    
+    def transform(self, chunk: Union[pd.DataFrame, np.ndarray], copy: bool = True) -> np.ndarray:
+        """
+        按已拟合的参数归一化：X * scale_ + min_（与MinMaxScaler.transform公式相同）
+        
+        Args:
+            chunk: 特征数据 (rows, features)
+            copy: 为False且chunk是可写的同dtype数组时直接原地修改chunk，不分配新数组
+            
+        Returns:
+            归一化后的数组
+        """
+        if self.scale_ is None:
+            raise ValueError("缩放器尚未拟合，请先调用normalize_data（训练模式）、partial_fit或load_scaler")
+        
+        values = np.array(chunk, dtype=self.dtype, copy=True) if copy else np.asarray(chunk, dtype=self.dtype)
+        if not values.flags.writeable:
+            values = values.copy()
+        np.multiply(values, self.scale_, out=values)
+        np.add(values, self.min_, out=values)
+        return values
+    
+    def _update_scale(self):
+        """由 data_min_/data_max_ 计算 scale_ 和 min_（transform为 X * scale_ + min_）"""
+        range_min, range_max = self.feature_range
+        data_range = self.data_max_ - self.data_min_
+        
+        # 常数列的区间为0，缩放系数按区间1计算
+        denominator = np.where(data_range < 10 * np.finfo(data_range.dtype).eps, 1.0, data_range)
+        self.scale_ = (range_max - range_min) / denominator
+        self.min_ = range_min - self.data_min_ * self.scale_
+    
+    @staticmethod
+    def quantize_int16(arr: np.ndarray) -> np.ndarray:
+        """
+        将归一化后的数据量化为int16（存储和传输量为float32的一半）
+        
+        Args:
+            arr: 取值在[-1, 1]内的数组（超出部分截断）
+            
+        Returns:
+            int16数组，1.0对应32767
+        """
+        return np.rint(np.clip(arr, -1.0, 1.0) * 32767.0).astype(np.int16)
+    
+    @staticmethod
+    def dequantize_int16(arr: np.ndarray, dtype: np.dtype = np.float32) -> np.ndarray:
+        """
+        quantize_int16 的逆变换（量化误差不超过 0.5/32767）
+        
+        Args:
+            arr: int16数组
+            dtype: 输出的浮点类型
             
-        return pd.DataFrame(scaled_data, columns=df.columns, index=df.index)
+        Returns:
+            浮点数组
+        """
+        values = arr.astype(dtype)
+        values /= 32767.0
+        return values
     
     def save_scaler(self, path: str):
-        """保存缩放器"""
+        """
+        保存缩放器
+        
+        默认以npz保存归一化参数数组（加载时不依赖sklearn）；
+        路径以.pkl结尾时仍用joblib保存MinMaxScaler对象，兼容旧格式
+        
+        Args:
+            path: 保存路径
+        """
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        joblib.dump(self.scaler, path)
+        if path.endswith('.pkl'):
+            import joblib
+            joblib.dump(self._to_sklearn_scaler(), path)
+            return
+        
+        # 传入文件对象，np.savez不会再给路径追加.npz后缀
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                data_min=self.data_min_,
+                data_max=self.data_max_,
+                feature_range=np.asarray(self.feature_range, dtype=np.float64),
+                n_samples_seen=self.n_samples_seen_,
+                feature_columns=np.asarray(self.feature_columns, dtype=str)
+            )
         
     def load_scaler(self, path: str):
-        """加载缩放器"""
-        if os.path.exists(path):
+        """
+        加载缩放器（.pkl为joblib保存的MinMaxScaler，其余为save_scaler保存的npz）
+        
+        Args:
+            path: 缩放器文件路径
+        """
+        if not os.path.exists(path):
+            print(f"警告: 缩放器文件 {path} 不存在")
+            return
+        
+        if path.endswith('.pkl'):
+            import joblib
             self.scaler = joblib.load(path)
+            self.feature_range = tuple(self.scaler.feature_range)
+            self.data_min_ = self.scaler.data_min_
+            self.data_max_ = self.scaler.data_max_
+            self.n_samples_seen_ = self.scaler.n_samples_seen_
         else:
-            print(f"警告: 缩放器文件 {path} 不存在")
+            with np.load(path) as saved:
+                self.feature_range = tuple(saved['feature_range'].tolist())
+                self.data_min_ = saved['data_min']
+                self.data_max_ = saved['data_max']
+                self.n_samples_seen_ = int(saved['n_samples_seen'])
+                if saved['feature_columns'].size:
+                    self.feature_columns = saved['feature_columns'].tolist()
+        self._update_scale()
+    
+    def _to_sklearn_scaler(self):
+        """将当前归一化参数写入self.scaler（MinMaxScaler，首次使用时创建），供joblib保存"""
+        if self.scaler is None:
+            from sklearn.preprocessing import MinMaxScaler
+            self.scaler = MinMaxScaler(feature_range=self.feature_range)
+        self.scaler.feature_range = self.feature_range
+        self.scaler.n_features_in_ = len(self.data_min_)
+        self.scaler.n_samples_seen_ = self.n_samples_seen_
+        self.scaler.data_min_ = self.data_min_
+        self.scaler.data_max_ = self.data_max_
+        self.scaler.data_range_ = self.data_max_ - self.data_min_
+        self.scaler.scale_ = self.scale_
+        self.scaler.min_ = self.min_
+        return self.scaler
 
     def generate_labels(self, df: pd.DataFrame, days: int = 5, threshold: float = 0.05) -> pd.DataFrame:
         """
@@ -126,17 +498,43 @@ class DataProcessor:
             threshold: 涨幅阈值 (例如0.05表示5%)
             
         Returns:
-            添加了label列的DataFrame
+            添加了label列的新DataFrame（不修改传入的df）
         """
-        df = df.copy()
+        # 计算未来N天的收益率和标签（按单只股票调用批量版本）
+        close = df['close'].to_numpy(dtype=np.float64)
+        future_return, labels = self.generate_labels_batch(close[:, None], days, threshold)
+        future_return = future_return[:, 0]
         
-        # 计算未来N天的收益率
-        df[f'future_return_{days}d'] = df['close'].shift(-days) / df['close'] - 1
+        # 移除最后N行（因为没有未来数据）及收盘价缺失的行；先筛选行再添加新列，不复制整个输入
+        valid = ~np.isnan(future_return)
         
         # 生成标签：1表示上涨超过阈值，0表示其他
-        df['label'] = (df[f'future_return_{days}d'] > threshold).astype(int)
-        
-        # 移除最后N行（因为没有未来数据）
-        df = df.dropna(subset=[f'future_return_{days}d'])
+        return add_columns(df.iloc[:len(future_return)][valid], {
+            f'future_return_{days}d': future_return[valid],
+            'label': labels[valid, 0].astype(int)
+        })
+    
+    def generate_labels_batch(
+        self,
+        close: np.ndarray,
+        days: int = 5,
+        threshold: float = 0.05
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量生成多只股票的未来收益率和分类标签（一次向量化计算，不逐只股票调用pandas）
         
-        return df
+        Args:
+            close: 收盘价矩阵 (时间, 股票)，按日期升序
+            days: 预测未来N天
+            threshold: 涨幅阈值 (例如0.05表示5%)
+            
+        Returns:
+            (未来收益率, 标签)，形状均为 (时间 - days, 股票)；已去掉最后N行，
+            收盘价缺失处收益率为NaN、标签为0
+        """
+        close = np.asarray(close, dtype=np.float64)
+        n = max(close.shape[0] - days, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            future_return = close[days:days + n] / close[:n] - 1
+        labels = (future_return > threshold).astype(np.int8)
+        return future_return, labels
@@ -0,0 +1,20 @@
+"""
+工具模块初始化
+Utilities Module
+"""
+
+from ._njit import HAS_NUMBA, njit, prange
+from .frames import add_columns, fast_concat, latest_value, sort_by
+from .rolling import rolling_max_min, rolling_mean_std
+
+__all__ = [
+    'HAS_NUMBA',
+    'njit',
+    'prange',
+    'add_columns',
+    'fast_concat',
+    'latest_value',
+    'sort_by',
+    'rolling_max_min',
+    'rolling_mean_std'
+]
@@ -0,0 +1,21 @@
+"""
+Numba JIT 兼容封装
+Numba JIT Compatibility Shim
+
+numba 为可选依赖：已安装时使用 numba.njit 编译数值循环，
+未安装时 njit 退化为空装饰器，函数按普通Python执行，prange 退化为 range。
+纯Python执行过慢的内核可先检查 HAS_NUMBA，改走numpy实现。
+"""
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:  # numba未安装，退化为普通Python函数
+    HAS_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """空装饰器，兼容 @njit 与 @njit(cache=True) 两种写法"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
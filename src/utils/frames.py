@@ -0,0 +1,89 @@
+"""
+DataFrame合并工具
+DataFrame Helpers
+
+约定：需要合并多个结果时先收集到列表，最后调用一次 fast_concat，
+不要在循环中逐个追加（每次追加都会整体复制，总开销为O(N²)）。
+按日期排序使用 sort_by，输入通常已有序，可省去整表排序。
+一次新增多列使用 add_columns，不要逐列赋值或 assign（逐列插入会使内部数据块碎片化）。
+"""
+
+from typing import Iterable, Optional
+
+import pandas as pd
+
+
+def fast_concat(frames: Iterable[Optional[pd.DataFrame]]) -> pd.DataFrame:
+    """
+    一次性合并多个DataFrame，跳过None与空表
+    
+    Args:
+        frames: DataFrame列表
+    
+    Returns:
+        合并后的DataFrame（重建索引），全部为空时返回空DataFrame
+    """
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True, sort=False)
+
+
+def sort_by(df: pd.DataFrame, column: str, ascending: bool = True) -> pd.DataFrame:
+    """
+    按列排序并重建索引；已按所需方向有序时不排序，顺序恰好相反时直接反转（O(N)）
+
+    Args:
+        df: DataFrame
+        column: 排序列
+        ascending: 是否升序
+
+    Returns:
+        排序后的DataFrame
+    """
+    values = df[column]
+    in_order = values.is_monotonic_increasing if ascending else values.is_monotonic_decreasing
+    reversed_order = values.is_monotonic_decreasing if ascending else values.is_monotonic_increasing
+    if in_order:
+        ordered = df
+    elif reversed_order:
+        ordered = df.iloc[::-1]
+    else:
+        ordered = df.sort_values(column, ascending=ascending)
+    return ordered.reset_index(drop=True)
+
+
+def add_columns(df: pd.DataFrame, columns: dict) -> pd.DataFrame:
+    """
+    一次性新增多列：先将新列组装为一个DataFrame，再按列拼接
+
+    与 df.assign(**columns) 结果相同（同名列被替换，但会移到末尾），
+    新列合并为按dtype划分的少数数据块，而不是每列插入一次
+
+    Args:
+        df: 原DataFrame（不会被修改）
+        columns: 列名 -> ndarray或与df同索引的Series
+
+    Returns:
+        新增列后的DataFrame
+    """
+    if not columns:
+        return df
+    new = pd.DataFrame(columns, index=df.index)
+    base = df.drop(columns=df.columns.intersection(new.columns))
+    return pd.concat([base, new], axis=1)
+
+
+def latest_value(df: pd.DataFrame, col: str, default=0):
+    """
+    读取首行（最新）单个字段值，列不存在时返回默认值
+
+    Args:
+        df: 按日期降序排列的DataFrame
+        col: 列名
+        default: 列不存在时的返回值
+
+    Returns:
+        首行该列的值
+    """
+    return df.at[df.index[0], col] if col in df.columns else default
@@ -0,0 +1,126 @@
+"""
+滑动窗口数值内核
+Rolling-Window Kernels
+
+直接在ndarray上计算滑动窗口统计量，numba可用时编译为机器码（见 _njit），
+供特征计算模块在单次遍历中得到多个统计量，不经过pandas的rolling对象。
+
+NaN约定与pandas rolling(window=n)一致：窗口未满或窗口内含NaN时结果为NaN；
+inf（如除以0产生）同样按缺失处理，不会污染之后窗口的累加和。
+"""
+
+import numpy as np
+
+from ._njit import njit
+
+
+@njit(cache=True, error_model='numpy')
+def rolling_mean_std(x: np.ndarray, window: int):
+    """
+    滑动窗口均值与样本标准差（ddof=1），一次遍历同时维护和与平方和
+
+    Args:
+        x: float64数组
+        window: 窗口长度
+
+    Returns:
+        (均值数组, 标准差数组)
+    """
+    n = len(x)
+    mean = np.full(n, np.nan)
+    std = np.full(n, np.nan)
+    s1 = 0.0
+    s2 = 0.0
+    bad = 0
+    for i in range(n):
+        v = x[i]
+        if np.isfinite(v):
+            s1 += v
+            s2 += v * v
+        else:
+            bad += 1
+        if i >= window:
+            old = x[i - window]
+            if np.isfinite(old):
+                s1 -= old
+                s2 -= old * old
+            else:
+                bad -= 1
+        if i >= window - 1 and bad == 0:
+            m = s1 / window
+            mean[i] = m
+            if window > 1:
+                # 浮点抵消可能得到极小的负数，截断为0
+                var = (s2 - s1 * m) / (window - 1)
+                std[i] = np.sqrt(var) if var > 0.0 else 0.0
+    return mean, std
+
+
+@njit(cache=True)
+def rolling_max_min(high: np.ndarray, low: np.ndarray, windows: np.ndarray):
+    """
+    多个窗口长度的滑动最高价/最低价，单调队列实现，一次遍历同时更新所有窗口
+
+    每个窗口维护一个下标队列：最高价队列从队首到队尾单调递减，
+    队首即窗口最大值；新值入队前弹出队尾所有不大于它的元素，
+    每个下标至多入队出队一次，总复杂度O(N·K)，与窗口长度无关
+
+    Args:
+        high: 最高价数组
+        low: 最低价数组
+        windows: 窗口长度数组
+
+    Returns:
+        (最高价矩阵, 最低价矩阵)，形状均为(N, K)，第k列对应 windows[k]
+    """
+    n = len(high)
+    k_count = len(windows)
+    hi = np.full((n, k_count), np.nan)
+    lo = np.full((n, k_count), np.nan)
+    hi_queue = np.empty((k_count, n), dtype=np.int64)
+    lo_queue = np.empty((k_count, n), dtype=np.int64)
+    hi_head = np.zeros(k_count, dtype=np.int64)
+    hi_tail = np.zeros(k_count, dtype=np.int64)
+    lo_head = np.zeros(k_count, dtype=np.int64)
+    lo_tail = np.zeros(k_count, dtype=np.int64)
+    hi_bad = np.zeros(k_count, dtype=np.int64)
+    lo_bad = np.zeros(k_count, dtype=np.int64)
+    for i in range(n):
+        h = high[i]
+        l = low[i]
+        for k in range(k_count):
+            w = windows[k]
+
+            # 新值入队（NaN不入队，只计数）
+            if h == h:
+                while hi_tail[k] > hi_head[k] and high[hi_queue[k, hi_tail[k] - 1]] <= h:
+                    hi_tail[k] -= 1
+                hi_queue[k, hi_tail[k]] = i
+                hi_tail[k] += 1
+            else:
+                hi_bad[k] += 1
+            if l == l:
+                while lo_tail[k] > lo_head[k] and low[lo_queue[k, lo_tail[k] - 1]] >= l:
+                    lo_tail[k] -= 1
+                lo_queue[k, lo_tail[k]] = i
+                lo_tail[k] += 1
+            else:
+                lo_bad[k] += 1
+
+            # 移出窗口的旧值
+            if i >= w:
+                if high[i - w] != high[i - w]:
+                    hi_bad[k] -= 1
+                if low[i - w] != low[i - w]:
+                    lo_bad[k] -= 1
+            while hi_tail[k] > hi_head[k] and hi_queue[k, hi_head[k]] <= i - w:
+                hi_head[k] += 1
+            while lo_tail[k] > lo_head[k] and lo_queue[k, lo_head[k]] <= i - w:
+                lo_head[k] += 1
+
+            if i >= w - 1:
+                if hi_bad[k] == 0:
+                    hi[i, k] = high[hi_queue[k, hi_head[k]]]
+                if lo_bad[k] == 0:
+                    lo[i, k] = low[lo_queue[k, lo_head[k]]]
+    return hi, lo